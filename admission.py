@@ -0,0 +1,88 @@
+import fcntl
+import math
+import os
+import threading
+import time
+
+# Admission control for an expensive route during a surge: at most `limit` requests run
+# at once in a process, up to `queue` more wait (for at most `timeout` seconds) for a
+# slot, and anything beyond that is turned away straight away, so the client is told to
+# retry instead of waiting on a worker until the request times out. Needs threaded
+# workers (gunicorn.conf.py uses gthread); a sync worker only ever runs one request.
+
+
+class AdmissionGate:
+    def __init__(self, limit, queue, timeout=10.0):
+        # limit <= 0 admits everything
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        # moving average of how long a slot is held, for retry_after()
+        self._held = 1.0
+
+    def acquire(self):
+        # True once a slot is held; False if the queue is full or no slot freed up in time
+        if self.limit <= 0:
+            return True
+        with self._cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        # pass on a wakeup this thread may have taken
+                        self._cond.notify()
+                        return False
+                    self._cond.wait(remaining)
+                self.active += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self, held):
+        # held: seconds the slot was in use
+        if self.limit <= 0:
+            return
+        with self._cond:
+            self.active -= 1
+            self._held += 0.2 * (held - self._held)
+            self._cond.notify()
+
+    def retry_after(self):
+        # whole seconds until the requests already admitted or waiting should be done
+        with self._cond:
+            backlog = self.active + self.waiting
+        return max(1, math.ceil(self._held * (backlog + 1) / max(self.limit, 1)))
+
+
+class SharedSlots:
+    # at most `slots` holders at once across every process using `directory`: each slot is a
+    # file held with flock, so a holder that dies frees its slot with it
+    def __init__(self, directory, slots):
+        self.directory = directory
+        self.slots = slots
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self):
+        # a handle to pass to release(), or None when every slot is taken
+        for n in range(self.slots):
+            f = open(os.path.join(self.directory, f"slot-{n}.lock"), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+    def release(self, handle):
+        fcntl.flock(handle, fcntl.LOCK_UN)
+        handle.close()
@@ -0,0 +1,146 @@
+import math
+
+from sqlite_db import connect
+
+# Cohort analytics kept up to date on every submit. Scores are small integers, so each
+# (scope, cohort, metric) keeps a histogram of counts per score value: count, mean,
+# variance, level bands, quantiles and percentile ranks are all read off at most
+# max-score + 1 rows, however many submissions there are.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cohort_scores (
+    scope TEXT NOT NULL,
+    cohort TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (scope, cohort, metric, score)
+) WITHOUT ROWID;
+"""
+
+SCOPES = ("all", "department", "classSection")
+TOTAL = "Total"
+
+
+class CohortAnalytics:
+    def __init__(self, db_path, engine):
+        self.db_path = str(db_path)
+        self.engine = engine
+        self.metrics = list(engine.sections) + [TOTAL]
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def _cohorts(self, student_info):
+        return [("all", ""), ("department", student_info.get("department", "")),
+                ("classSection", student_info.get("classSection", ""))]
+
+    def _increments(self, student_info, section_scores, total):
+        for scope, cohort in self._cohorts(student_info):
+            for sec in self.engine.sections:
+                yield scope, cohort, sec, int(section_scores.get(sec, 0))
+            yield scope, cohort, TOTAL, int(total)
+
+    def record_many(self, rows):
+        # rows: (student_info, section_scores, total), applied in one transaction
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO cohort_scores VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (scope, cohort, metric, score) DO UPDATE SET n = n + 1",
+                (inc for row in rows for inc in self._increments(*row)))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def record(self, student_info, section_scores, total):
+        self.record_many([(student_info, section_scores, total)])
+
+    def rebuild(self, records, batch=5000):
+        # records: stored submissions; used after an import or re-scoring
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM cohort_scores")
+        finally:
+            conn.close()
+        chunk = []
+        for rec in records:
+            chunk.append((rec, rec["section_scores"], rec["total"]))
+            if len(chunk) >= batch:
+                self.record_many(chunk)
+                chunk = []
+        if chunk:
+            self.record_many(chunk)
+
+    def cohorts(self, scope):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT DISTINCT cohort FROM cohort_scores WHERE scope = ? AND metric = ? ORDER BY cohort",
+                                (scope, TOTAL)).fetchall()
+            return [r[0] for r in rows]
+        finally:
+            conn.close()
+
+    def _histograms(self, scope, cohort, metric=None):
+        conn = self._connect()
+        try:
+            if metric is None:
+                rows = conn.execute("SELECT metric, score, n FROM cohort_scores WHERE scope = ? AND cohort = ? "
+                                    "ORDER BY metric, score", (scope, cohort)).fetchall()
+            else:
+                rows = conn.execute("SELECT metric, score, n FROM cohort_scores WHERE scope = ? AND cohort = ? "
+                                    "AND metric = ? ORDER BY score", (scope, cohort, metric)).fetchall()
+        finally:
+            conn.close()
+        hists = {}
+        for m, score, n in rows:
+            hists.setdefault(m, []).append((score, n))
+        return hists
+
+    def _level_of(self, metric, score):
+        if metric == TOTAL:
+            return self.engine.overall_level_name(score)
+        return self.engine.section_level_name(self.engine.sections.index(metric), score)
+
+    def _describe(self, metric, hist):
+        count = sum(n for _, n in hist)
+        mean = sum(score * n for score, n in hist) / count
+        variance = sum(n * (score - mean) ** 2 for score, n in hist) / count
+        levels = {}
+        for score, n in hist:
+            lvl = self._level_of(metric, score)
+            levels[lvl] = levels.get(lvl, 0) + n
+        return {"count": count, "mean": round(mean, 2), "variance": round(variance, 2),
+                "sd": round(math.sqrt(variance), 2), "min": hist[0][0], "max": hist[-1][0],
+                "p25": quantile(hist, count, 0.25), "median": quantile(hist, count, 0.5),
+                "p75": quantile(hist, count, 0.75), "levels": levels}
+
+    def summary(self, scope="all", cohort=""):
+        hists = self._histograms(scope, cohort)
+        metrics = {m: self._describe(m, hists[m]) for m in self.metrics if m in hists}
+        count = metrics[TOTAL]["count"] if TOTAL in metrics else 0
+        return {"scope": scope, "cohort": cohort, "count": count, "metrics": metrics}
+
+    def percentile_rank(self, scope, cohort, metric, score):
+        # share of the cohort scoring below `score`, counting ties as half; None if empty
+        hist = self._histograms(scope, cohort, metric).get(metric)
+        if not hist:
+            return None, 0
+        count = sum(n for _, n in hist)
+        below = sum(n for s, n in hist if s < score)
+        equal = sum(n for s, n in hist if s == score)
+        return round((below + 0.5 * equal) / count * 100, 1), count
+
+
+def quantile(hist, count, q):
+    # lowest score whose cumulative count reaches q of the cohort
+    target = max(1, math.ceil(q * count))
+    seen = 0
+    for score, n in hist:
+        seen += n
+        if seen >= target:
+            return score
+    return hist[-1][0]
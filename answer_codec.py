@@ -0,0 +1,92 @@
+import numpy as np
+
+# Compact storage for the 50 raw answers: Likert 1..40 ("1".."5") and SJT 41..50 ("A".."D")
+# are packed as one mixed-radix integer, 15 bytes per submission.
+
+LIKERT_OPTIONS = "12345"
+MCQ_OPTIONS = "ABCD"
+LIKERT_QUESTIONS_COUNT = 40
+MCQ_QUESTIONS_COUNT = 10
+QUESTION_COUNT = LIKERT_QUESTIONS_COUNT + MCQ_QUESTIONS_COUNT
+
+
+def options_for(qnum):
+    return LIKERT_OPTIONS if qnum <= LIKERT_QUESTIONS_COUNT else MCQ_OPTIONS
+
+
+def valid_answer(qnum, value):
+    return value is not None and len(value) == 1 and value in options_for(qnum)
+
+
+def read_answers(get):
+    # the /submit rules: get(qnum) -> submitted value or None; returns (answers, error message)
+    answers = {}
+    for q in range(1, QUESTION_COUNT + 1):
+        value = get(q)
+        if value is None:
+            return None, "Please answer all questions before submitting."
+        if not valid_answer(q, value):
+            return None, f"Invalid answer for question {q}."
+        answers[str(q)] = value
+    return answers, None
+
+
+def _packed_size():
+    n = 1
+    for q in range(1, QUESTION_COUNT + 1):
+        n *= len(options_for(q))
+    return (n.bit_length() + 7) // 8
+
+PACKED_SIZE = _packed_size()
+
+
+def pack_answers(answers):
+    # answers: {"1": "5", ..., "50": "C"}, every value valid
+    n = 0
+    for q in range(QUESTION_COUNT, 0, -1):
+        opts = options_for(q)
+        n = n * len(opts) + opts.index(answers[str(q)])
+    return n.to_bytes(PACKED_SIZE, "big")
+
+
+def unpack_answers(blob):
+    n = int.from_bytes(blob, "big")
+    answers = {}
+    for q in range(1, QUESTION_COUNT + 1):
+        opts = options_for(q)
+        n, digit = divmod(n, len(opts))
+        answers[str(q)] = opts[digit]
+    return answers
+
+
+def _digit_runs():
+    # consecutive questions with the same radix, split so radix**len fits in 32 bits
+    runs, q = [], 1
+    while q <= QUESTION_COUNT:
+        radix, start = len(options_for(q)), q
+        while q <= QUESTION_COUNT and len(options_for(q)) == radix and radix ** (q - start + 1) < 2 ** 32:
+            q += 1
+        runs.append((start, q - start, radix))
+    return runs
+
+
+def unpack_codes_many(blobs):
+    # vectorized unpack_answers for many blobs at once -> N x 50 array of option indices
+    raw = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(-1, PACKED_SIZE)
+    width = -(-PACKED_SIZE // 4) * 4
+    padded = np.zeros((raw.shape[0], width), dtype=np.uint8)
+    padded[:, width - PACKED_SIZE:] = raw
+    limbs = padded.view(">u4").astype(np.uint64)  # most significant limb first
+    codes = np.empty((raw.shape[0], QUESTION_COUNT), dtype=np.uint8)
+    for start, count, radix in _digit_runs():
+        # long division of the whole number by radix**count, 32 bits at a time
+        divisor = np.uint64(radix ** count)
+        rem = np.zeros(raw.shape[0], dtype=np.uint64)
+        for k in range(limbs.shape[1]):
+            cur = (rem << np.uint64(32)) | limbs[:, k]
+            limbs[:, k] = cur // divisor
+            rem = cur % divisor
+        for q in range(start, start + count):
+            codes[:, q - 1] = rem % np.uint64(radix)
+            rem //= np.uint64(radix)
+    return codes
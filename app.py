@@ -1,15 +1,38 @@
 
 import os
-from flask import Flask, render_template, request, send_file, redirect, url_for, flash, session
+from flask import Flask, render_template, request, send_file, redirect, url_for, flash, session, Response, stream_with_context, jsonify, g
 from datetime import datetime
 from io import BytesIO
 from pathlib import Path
+import hashlib
+import click
 import csv
+import json
+import re
+import sys
+import time
+from datetime import date, timedelta
+from item_stats import ItemStatistics
+from mail_queue import MailQueue, SMTPPool
+from metrics import COUNTER, HISTOGRAM, Metrics, SamplingProfiler
+from page_cache import RenderedPage
+from bulk_export import page_collector, render_in_order, stream_merged_pdf, stream_zip
+from bulk_ingest import Progress, ResponseFile, chunked
+from draft_store import DraftStore
+from admission import AdmissionGate, SharedSlots
+from analytics import TOTAL, CohortAnalytics
+from answer_codec import QUESTION_COUNT, options_for, pack_answers, read_answers, unpack_answers, valid_answer
+from pdf_layout import StaticLayer, new_canvas, paragraph_layer, text_layer
+from render_queue import RenderQueue
+from report_cache import ReportCache
+from report_catalog import ReportCatalog
+from scoring import ScoringEngine
+from submission_export import FORMATS, byte_range, parse_columns, stream_export
+from submission_store import SubmissionStore
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
-from reportlab.pdfgen import canvas
 
-app = Flask(__name__)
+app = Flask(__name__, template_folder=".")
 app.secret_key = os.environ.get("FLASK_SECRET", "change_this_secret")
 
 # Config: default teacher creds for testing (you can change or set env vars later)
@@ -21,6 +44,79 @@ INSTITUTION_NAME = "Excel Engineering College (Autonomous)"
 DATA_DIR = Path("teacher_reports")
 DATA_DIR.mkdir(exist_ok=True)
 CSV_FILE = Path("submissions.csv")
+SUBMISSIONS_DB = Path(os.environ.get("SUBMISSIONS_DB", "submissions.db"))
+RENDER_QUEUE_DB = Path(os.environ.get("RENDER_QUEUE_DB", "render_jobs.db"))
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+RENDER_QUEUE_MAX = int(os.environ.get("RENDER_QUEUE_MAX", 1000))
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", os.cpu_count() or 1))
+# cohort exports rendering at once across all workers; each one runs EXPORT_WORKERS processes
+EXPORT_CONCURRENCY = int(os.environ.get("EXPORT_CONCURRENCY", 1))
+ITEM_STATS_CACHE = Path(os.environ.get("ITEM_STATS_CACHE", "item_stats.npz"))
+# smallest department for which the student report shows a cohort percentile
+PERCENTILE_MIN_COHORT = int(os.environ.get("PERCENTILE_MIN_COHORT", 10))
+REPORT_CACHE_DIR = DATA_DIR / "cache"
+REPORT_CACHE_MAX_MB = int(os.environ.get("REPORT_CACHE_MAX_MB", 256))
+REPORT_CATALOG_DIR = DATA_DIR / "catalog"
+REPORT_CATALOG_SHARDS = int(os.environ.get("REPORT_CATALOG_SHARDS", 8))
+# render teacher reports in the background right after submit instead of on first download
+PREWARM_TEACHER_REPORTS = os.environ.get("PREWARM_TEACHER_REPORTS", "0") == "1"
+METRICS_DB = Path(os.environ.get("METRICS_DB", "metrics.db"))
+# if set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+# emailing student reports is off unless SMTP_HOST is set
+SMTP_HOST = os.environ.get("SMTP_HOST", "")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASS = os.environ.get("SMTP_PASS", "")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "1") == "1"
+SMTP_SSL = os.environ.get("SMTP_SSL", "0") == "1"
+MAIL_FROM = os.environ.get("MAIL_FROM", SMTP_USER or "reports@localhost")
+MAIL_QUEUE_DB = Path(os.environ.get("MAIL_QUEUE_DB", "mail_queue.db"))
+MAIL_WORKERS = int(os.environ.get("MAIL_WORKERS", 1))
+MAIL_BATCH = int(os.environ.get("MAIL_BATCH", 20))
+MAIL_QUEUE_MAX = int(os.environ.get("MAIL_QUEUE_MAX", 5000))
+# surge mode: /submit requests running at once per worker, how many more may wait for a
+# slot and for how long; past that /submit answers 503 with Retry-After (0 turns it off)
+SUBMIT_CONCURRENCY = int(os.environ.get("SUBMIT_CONCURRENCY", 2))
+SUBMIT_QUEUE = int(os.environ.get("SUBMIT_QUEUE", 8))
+SUBMIT_QUEUE_TIMEOUT = float(os.environ.get("SUBMIT_QUEUE_TIMEOUT", 10))
+# autosaved answers of tests in progress, shared by all workers (e.g. /dev/shm/drafts.db)
+DRAFTS_DB = Path(os.environ.get("DRAFTS_DB", "drafts.db"))
+DRAFT_TTL_HOURS = float(os.environ.get("DRAFT_TTL_HOURS", 6))
+DRAFT_MAX = int(os.environ.get("DRAFT_MAX", 5000))
+
+# per-route and per-stage timings and counters, aggregated across workers for /metrics
+metrics = Metrics(METRICS_DB)
+metrics.describe("psychometric_request_seconds", HISTOGRAM, "Time to produce a response, by route.")
+metrics.describe("psychometric_stage_seconds", HISTOGRAM, "Time spent in each stage of a request.")
+metrics.describe("psychometric_requests_total", COUNTER, "Responses by route and status code.")
+metrics.describe("psychometric_submissions_total", COUNTER, "Submissions stored.")
+metrics.describe("psychometric_rejections_total", COUNTER, "Requests rejected with 400, by route.")
+metrics.describe("psychometric_pdf_bytes_total", COUNTER, "Bytes of PDF reports generated, by kind.")
+metrics.describe("psychometric_emails_queued_total", COUNTER, "Student report emails queued.")
+metrics.describe("psychometric_shed_total", COUNTER, "Requests turned away with 503 while overloaded, by route.")
+profiler = SamplingProfiler(metrics, PROFILE_DIR)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    profiler.start(request.endpoint)
+
+@app.after_request
+def record_request(response):
+    # streamed responses are timed up to the first byte
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.observe("psychometric_request_seconds", time.perf_counter() - g.request_started,
+                    route=route, method=request.method)
+    metrics.inc("psychometric_requests_total", route=route, method=request.method, status=response.status_code)
+    if response.status_code == 400:
+        metrics.inc("psychometric_rejections_total", route=route)
+    return response
+
+@app.teardown_request
+def stop_profiler(exc):
+    profiler.stop()
 
 # Questions (from the provided PDFs)
 LIKERT_QUESTIONS = [
@@ -109,6 +205,11 @@ SECTION_MAX = {
     'Situational Judgment Test (SJT)': 40
 }
 
+# changes whenever anything a teacher report shows would change; cached reports are keyed by it
+SCORING_VERSION = hashlib.sha1(repr((LIKERT_QUESTIONS, MCQ_QUESTIONS, sorted(SJT_KEY.items()),
+                                     [(sec, rng.start, rng.stop) for sec, rng in SECTION_MAP.items()],
+                                     sorted(SECTION_MAX.items()))).encode()).hexdigest()[:12]
+
 # thresholds & recommendation functions (from your detail explanation)
 def overall_level_and_recommendation(pct):
     if pct >= 85:
@@ -137,74 +238,53 @@ def section_level_and_recommendation(section, score):
     if pct >= 20: return "Basic Awareness", "Start with foundational training and practice."
     return "Needs Improvement", "Immediate guided practice and mentoring recommended."
 
+# scoring tables compiled once; batch re-scoring of whole cohorts uses SCORING.score()
+SCORING = ScoringEngine(SJT_KEY, SECTION_MAP, SECTION_MAX, section_level_and_recommendation, overall_level_and_recommendation)
+
 # helper to compute scores
 def compute_scores(answers):
-    per_q = {}
-    # likert 1..40 stored as "5"/"4"... convert to int
-    for i in range(1,41):
-        v = answers.get(str(i))
-        per_q[i] = int(v) if v and v.isdigit() else 0
-    # MCQ 41..50
-    for i in range(41,51):
-        v = answers.get(str(i))
-        per_q[i] = SJT_KEY.get(i, {}).get(v, 0)
-    # section totals
-    section_scores = {}
-    for sec, rng in SECTION_MAP.items():
-        s = sum(per_q[q] for q in rng)
-        section_scores[sec] = s
-    total = sum(section_scores.values())
-    max_total = sum(SECTION_MAX.values())
-    return section_scores, total, max_total, per_q
+    # same engine as batch scoring, so single and cohort results always agree
+    return SCORING.score_one(answers)
 
 # PDF helpers: draw justified paragraph
 def draw_paragraph_justified(c, text, x, y, max_width, leading=12, fontname="Helvetica", fontsize=10):
-    words = text.split()
-    lines = []
-    line = []
-    for w in words:
-        test = " ".join(line + [w])
-        if c.stringWidth(test, fontname, fontsize) <= max_width:
-            line.append(w)
-        else:
-            lines.append(line)
-            line = [w]
-    if line:
-        lines.append(line)
-    cur_y = y
-    for idx, line_words in enumerate(lines):
-        if not line_words:
-            cur_y -= leading
-            continue
-        line_text = " ".join(line_words)
-        if idx != len(lines)-1:
-            # justify: distribute extra space
-            total_words_width = sum(c.stringWidth(w, fontname, fontsize) for w in line_words)
-            spaces = len(line_words)-1 if len(line_words)>1 else 1
-            extra = max_width - total_words_width
-            space_width = extra / spaces
-            cur_x = x
-            for j, w in enumerate(line_words):
-                c.drawString(cur_x, cur_y, w)
-                cur_x += c.stringWidth(w, fontname, fontsize) + space_width
-        else:
-            # last line: left align
-            c.drawString(x, cur_y, line_text)
-        cur_y -= leading
-    return cur_y
+    # line breaks, word positions and the drawn operators are cached per (text, width, font)
+    layer = paragraph_layer(text, max_width, leading, fontname, fontsize)
+    layer.draw(c, x, y)
+    return y - layer.height
 
-def generate_student_pdf(student_info, section_scores, total, max_total, section_levels):
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+# static page layers, built once and pasted into every report
+STUDENT_MARGIN = 20*mm
+TEACHER_MARGIN = 16*mm
+
+def _draw_student_header(c):
     width, height = A4
-    margin = 20*mm
-    y = height - margin
+    y = height - STUDENT_MARGIN
     c.setFont("Helvetica-Bold", 16)
     c.drawCentredString(width/2, y, INSTITUTION_NAME)
-    y -= 18
     c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width/2, y, "Psychometric Test Report - Navigating the Interview")
-    y -= 20
+    c.drawCentredString(width/2, y - 18, "Psychometric Test Report - Navigating the Interview")
+
+def _draw_student_footer(c):
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawCentredString(A4[0]/2, 18, "This student-facing report contains levels & recommendations only. Raw scores are confidential.")
+
+def _draw_teacher_header(c):
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(TEACHER_MARGIN, A4[1] - TEACHER_MARGIN, "Teacher Detailed Report")
+
+STUDENT_HEADER = StaticLayer(_draw_student_header, lazy=True)
+STUDENT_FOOTER = StaticLayer(_draw_student_footer, lazy=True)
+TEACHER_HEADER = StaticLayer(_draw_teacher_header, lazy=True)
+
+def generate_student_pdf(student_info, section_scores, total, max_total, section_levels, cohort_percentile=None):
+    buffer = BytesIO()
+    c = new_canvas(buffer)
+    width, height = A4
+    margin = STUDENT_MARGIN
+    y = height - margin
+    STUDENT_HEADER.draw(c)
+    y -= 38
 
     c.setFont("Helvetica-Bold", 11)
     c.drawString(margin, y, f"Name: {student_info.get('name')}")
@@ -239,59 +319,60 @@ def generate_student_pdf(student_info, section_scores, total, max_total, section
     c.setFillColorRGB(0,0,0)
     y = bar_y - 16
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Overall Result")
+    text_layer("Overall Result", "Helvetica-Bold", 12).draw(c, margin, y)
     y -= 12
     c.setFont("Helvetica", 11)
     c.drawString(margin, y, f"Overall Percentage: {pct}%")
     c.drawRightString(width - margin, y, f"Level: {overall_level}")
     y -= 14
+    if cohort_percentile is not None:
+        cohort, rank = cohort_percentile
+        c.setFont("Helvetica", 10)
+        c.drawString(margin, y, f"Percentile within {cohort}: {rank:.0f}")
+        y -= 14
 
     # overall recommendation (justified)
-    c.setFont("Helvetica", 10)
     y = draw_paragraph_justified(c, overall_rec, margin, y, width - 2*margin, leading=12, fontsize=10)
     y -= 8
 
     # Section summaries: show level and recommendation (JUSTIFIED)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Section-wise Levels & Recommendations")
+    text_layer("Section-wise Levels & Recommendations", "Helvetica-Bold", 12).draw(c, margin, y)
     y -= 14
-    c.setFont("Helvetica-Bold", 10)
     for sec, (lvl, rec) in section_levels.items():
-        c.drawString(margin, y, f"{sec}: {lvl}")
+        text_layer(f"{sec}: {lvl}", "Helvetica-Bold", 10).draw(c, margin, y)
         y -= 12
-        c.setFont("Helvetica", 10)
         y = draw_paragraph_justified(c, rec, margin+8, y, width - 2*margin - 8, leading=11, fontsize=10)
         y -= 10
-        c.setFont("Helvetica-Bold", 10)
         if y < 80:
             c.showPage()
             y = height - margin
 
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawCentredString(width/2, 18, "This student-facing report contains levels & recommendations only. Raw scores are confidential.")
+    STUDENT_FOOTER.draw(c)
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+def generate_teacher_pdf(student_info, section_scores, total, max_total, per_q_scores, answers, submitted_at=None):
+    buffer = BytesIO()
+    c = new_canvas(buffer)
+    draw_teacher_report(c, student_info, section_scores, total, max_total, per_q_scores, answers, submitted_at)
     c.save()
     buffer.seek(0)
     return buffer
 
-def generate_teacher_pdf(student_info, section_scores, total, max_total, per_q_scores, answers):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_name = "".join(c for c in student_info.get("name","Unknown") if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
-    filename = DATA_DIR / f"TeacherReport_{safe_name}_{timestamp}.pdf"
-    c = canvas.Canvas(str(filename), pagesize=A4)
+def draw_teacher_report(c, student_info, section_scores, total, max_total, per_q_scores, answers, submitted_at=None):
+    submitted_at = submitted_at or datetime.now()
     width, height = A4
-    margin = 16*mm
+    margin = TEACHER_MARGIN
     y = height - margin
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, "Teacher Detailed Report")
+    TEACHER_HEADER.draw(c)
     y -= 16
     c.setFont("Helvetica", 10)
     c.drawString(margin, y, f"Student: {student_info.get('name')}   Roll: {student_info.get('rollno')}   Dept: {student_info.get('department')}")
-    c.drawRightString(width - margin, y, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    c.drawRightString(width - margin, y, f"Date: {submitted_at.strftime('%Y-%m-%d %H:%M:%S')}")
     y -= 14
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Section Scores (raw)")
+    text_layer("Section Scores (raw)", "Helvetica-Bold", 12).draw(c, margin, y)
     y -= 12
     c.setFont("Helvetica", 10)
     for sec, sc in section_scores.items():
@@ -304,83 +385,614 @@ def generate_teacher_pdf(student_info, section_scores, total, max_total, per_q_s
     c.drawString(margin, y, f"Total Score: {total} / {sum(SECTION_MAX.values())}   ({round((total/sum(SECTION_MAX.values()))*100,2)}%)")
     y -= 16
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Per-question responses (Q#, Answer, Score)")
+    text_layer("Per-question responses (Q#, Answer, Score)", "Helvetica-Bold", 12).draw(c, margin, y)
     y -= 12
-    c.setFont("Helvetica", 9)
     for qnum in range(1,51):
-        if qnum <= 40:
-            qtext = LIKERT_QUESTIONS[qnum-1]
-            ans = answers.get(str(qnum))
-            sc = per_q_scores.get(qnum, 0)
-            line = f"{qnum}. {qtext} — Answer: {ans} — Score: {sc}"
-        else:
-            qtext = MCQ_QUESTIONS[qnum-41][0]
-            ans = answers.get(str(qnum))
-            sc = per_q_scores.get(qnum, 0)
-            line = f"{qnum}. {qtext} — Answer: {ans} — Score: {sc}"
+        line = teacher_question_line(qnum, answers.get(str(qnum)), per_q_scores.get(qnum, 0))
+        # each question has only a handful of possible lines, so these are cached layers too
         if len(line) > 120:
-            c.drawString(margin, y, line[:120])
+            text_layer(line[:120], "Helvetica", 9).draw(c, margin, y)
             y -= 10
-            c.drawString(margin+8, y, line[120:])
+            text_layer(line[120:], "Helvetica", 9).draw(c, margin+8, y)
             y -= 12
         else:
-            c.drawString(margin, y, line)
+            text_layer(line, "Helvetica", 9).draw(c, margin, y)
             y -= 12
         if y < 80:
             c.showPage(); y = height - margin
-    c.save()
-    return filename
 
-# CSV initialization
-if not CSV_FILE.exists():
-    with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        header = ["timestamp","name","rollno","department","classSection","email","total","percentage"]
-        header += list(SECTION_MAP.keys())
-        writer.writerow(header)
+def teacher_question_line(qnum, ans, sc):
+    qtext = LIKERT_QUESTIONS[qnum-1] if qnum <= 40 else MCQ_QUESTIONS[qnum-41][0]
+    return f"{qnum}. {qtext} — Answer: {ans} — Score: {sc}"
+
+def prebuild_report_layers():
+    # lay out every recommendation paragraph and per-question line a report can contain
+    width = A4[0]
+    for pct in (100, 85, 70, 55, 40, 0):
+        paragraph_layer(overall_level_and_recommendation(pct)[1], width - 2*STUDENT_MARGIN, 12, "Helvetica", 10)
+    for sec, max_s in SECTION_MAX.items():
+        for score in range(max_s + 1):
+            lvl, rec = section_level_and_recommendation(sec, score)
+            text_layer(f"{sec}: {lvl}", "Helvetica-Bold", 10)
+            paragraph_layer(rec, width - 2*STUDENT_MARGIN - 8, 11, "Helvetica", 10)
+    for qnum in range(1, 51):
+        for ans in options_for(qnum):
+            _, _, _, per_q = compute_scores({str(qnum): ans})
+            line = teacher_question_line(qnum, ans, per_q[qnum])
+            for part in ((line[:120], line[120:]) if len(line) > 120 else (line,)):
+                text_layer(part, "Helvetica", 9)
+
+_prewarmed = False
+
+def prewarm():
+    # load reportlab and its font metrics, lay out every report text and render one report
+    # of each kind, so the first students do not pay for it; gunicorn.conf.py calls this in
+    # the master under --preload (forked workers share it all), else in each worker
+    global _prewarmed
+    if _prewarmed:
+        return
+    prebuild_report_layers()
+    answers = {str(q): options_for(q)[0] for q in range(1, 51)}
+    section_scores, total, max_total, per_q_scores = compute_scores(answers)
+    section_levels = {sec: section_level_and_recommendation(sec, sc) for sec, sc in section_scores.items()}
+    student_info = {"name": "Prewarm", "rollno": "0", "department": "", "classSection": "", "email": ""}
+    generate_student_pdf(student_info, section_scores, total, max_total, section_levels, ("", 50))
+    generate_teacher_pdf(student_info, section_scores, total, max_total, per_q_scores, answers, datetime.now())
+    _prewarmed = True
+
+def safe_filename(name):
+    # a student name as it appears in report filenames: letters, digits and underscores
+    return "".join(c for c in name if c.isalnum() or c in (" ", "_")).strip().replace(" ", "_")
+
+def teacher_report_filename(rec):
+    return f"TeacherReport_{safe_filename(rec.get('name') or 'Unknown')}_{rec['id']}.pdf"
+
+# teacher reports are rendered from the stored answers when first needed, then cached
+# index of every report PDF under DATA_DIR, for the dashboard; see `flask reconcile-reports`
+report_catalog = ReportCatalog(REPORT_CATALOG_DIR, shards=REPORT_CATALOG_SHARDS)
+
+def cached_report_name(filename):
+    # catalog names are relative to DATA_DIR
+    return f"{REPORT_CACHE_DIR.name}/{filename}"
+
+report_cache = ReportCache(REPORT_CACHE_DIR, SCORING_VERSION, max_bytes=REPORT_CACHE_MAX_MB * 1024 * 1024,
+                           on_remove=lambda names: report_catalog.remove([cached_report_name(n) for n in names]))
+
+def draw_teacher_report_for(c, rec):
+    answers = unpack_answers(rec["answers"])
+    section_scores, total, max_total, per_q_scores = compute_scores(answers)
+    draw_teacher_report(c, rec, section_scores, total, max_total, per_q_scores, answers,
+                        datetime.fromisoformat(rec["timestamp"]))
+
+def teacher_report_bytes(rec):
+    # rec: a stored submission with answers; also runs in export worker processes
+    with metrics.stage("generate_teacher_pdf"):
+        buffer = BytesIO()
+        c = new_canvas(buffer)
+        draw_teacher_report_for(c, rec)
+        c.save()
+        data = buffer.getvalue()
+    metrics.inc("psychometric_pdf_bytes_total", len(data), kind="teacher")
+    return data
+
+def teacher_report_pages(rec):
+    c = page_collector(pagesize=A4)
+    draw_teacher_report_for(c, rec)
+    return c.finish()
+
+def render_teacher_report(submission_id):
+    path = report_cache.get(submission_id)
+    if path is not None:
+        return path
+    rec = store.get(submission_id)
+    if rec is None or rec["answers"] is None:
+        return None
+    data = teacher_report_bytes(rec)
+    path = report_cache.put(submission_id, data)
+    report_catalog.add(cached_report_name(path.name), len(data), time.time(), submission_id,
+                       rec["name"], rec["rollno"], rec["department"])
+    return path
+
+def cached_teacher_report(rec):
+    path = report_cache.get(rec["id"])
+    return path.read_bytes() if path is not None else None
+
+def export_teacher_reports(fmt, filters, workers=EXPORT_WORKERS):
+    # generator of output chunks for a cohort export; fmt is "zip" or "pdf"
+    records = (r for r in store.iter_all(**filters) if r["answers"] is not None)
+    if fmt == "pdf":
+        return stream_merged_pdf(render_in_order(records, teacher_report_pages, workers=workers))
+    return stream_zip(render_in_order(records, teacher_report_bytes, cached=cached_teacher_report, workers=workers),
+                      teacher_report_filename)
+
+def export_filters(department="", class_section="", since="", until=""):
+    # dates are YYYY-MM-DD and inclusive; raises ValueError on a malformed date
+    filters = {"department": department.strip(), "classSection": class_section.strip()}
+    if since:
+        filters["since"] = date.fromisoformat(since).isoformat()
+    if until:
+        filters["until"] = (date.fromisoformat(until) + timedelta(days=1)).isoformat()
+    return filters
+
+def render_teacher_job(payload):
+    path = render_teacher_report(payload["submission_id"])
+    return path.name if path else None
+
+render_queue = RenderQueue(RENDER_QUEUE_DB, {"teacher_pdf": render_teacher_job},
+                           workers=RENDER_WORKERS, max_pending=RENDER_QUEUE_MAX)
+
+# student reports are emailed by sender threads, never by the request that queued them
+mail_queue = MailQueue(MAIL_QUEUE_DB, SMTPPool(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS,
+                                               starttls=SMTP_STARTTLS, use_ssl=SMTP_SSL),
+                       MAIL_FROM, workers=MAIL_WORKERS if SMTP_HOST else 0, batch_size=MAIL_BATCH,
+                       max_pending=MAIL_QUEUE_MAX)
+
+@app.before_request
+def start_render_workers():
+    # picks up jobs left over from a previous run; no-op once running in this process.
+    # Without prewarming, render threads only start for leftover jobs or on enqueue.
+    if PREWARM_TEACHER_REPORTS:
+        render_queue.start()
+    else:
+        render_queue.resume()
+    mail_queue.start()
+
+def queue_student_report(student_info, pdf_bytes, filename):
+    # returns the message id, or None if the report is not emailed (no SMTP, no address, queue full)
+    if not SMTP_HOST or "@" not in student_info["email"]:
+        return None
+    body = (f"Dear {student_info['name'] or 'student'},\n\n"
+            f"Your psychometric assessment report from {INSTITUTION_NAME} is attached.\n")
+    message_id = mail_queue.enqueue(student_info["email"], "Your psychometric assessment report", body,
+                                    (filename, pdf_bytes))
+    if message_id is not None:
+        metrics.inc("psychometric_emails_queued_total")
+    return message_id
+
+# submissions store (replaces the old append-only submissions.csv; see `flask import-csv`)
+store = SubmissionStore(SUBMISSIONS_DB, SECTION_MAP.keys())
+# running per-cohort aggregates, updated on every submit
+analytics = CohortAnalytics(SUBMISSIONS_DB, SCORING)
+
+LEGACY_REPORT = re.compile(r"TeacherReport_(.*)_(\d{8}_\d{6})\.pdf")
+CACHED_REPORT = re.compile(r"(\d+)_(\w+)\.pdf")
+
+def legacy_report_submission(safe_name, stamp):
+    # archived reports were written alongside the CSV row, within a second or so of it
+    written = datetime.strptime(stamp, "%Y%m%d_%H%M%S")
+    for rec in store.page(limit=20, since=(written - timedelta(seconds=2)).isoformat(),
+                          until=(written + timedelta(seconds=3)).isoformat()):
+        if safe_filename(rec["name"]) == safe_name:
+            return rec
+    return None
+
+def scan_reports():
+    # catalog entries for the report PDFs on disk: archived reports and cached renders
+    with os.scandir(DATA_DIR) as entries:
+        for entry in entries:
+            m = LEGACY_REPORT.fullmatch(entry.name)
+            if not m or not entry.is_file():
+                continue
+            st = entry.stat()
+            rec = legacy_report_submission(*m.groups()) or {"name": m.group(1).replace("_", " ")}
+            yield {"filename": entry.name, "submission_id": rec.get("id"), "name": rec["name"],
+                   "rollno": rec.get("rollno", ""), "department": rec.get("department", ""),
+                   "size": st.st_size, "mtime": st.st_mtime}
+    with os.scandir(REPORT_CACHE_DIR) as entries:
+        for entry in entries:
+            m = CACHED_REPORT.fullmatch(entry.name)
+            if not m or m.group(2) != SCORING_VERSION:
+                continue
+            rec = store.get(int(m.group(1)))
+            if rec is None:
+                continue
+            st = entry.stat()
+            yield {"filename": cached_report_name(entry.name), "submission_id": rec["id"], "name": rec["name"],
+                   "rollno": rec["rollno"], "department": rec["department"], "size": st.st_size, "mtime": st.st_mtime}
+
+@app.cli.command("reconcile-reports")
+def reconcile_reports_command():
+    """Rebuild the report catalog from the files in teacher_reports/."""
+    n = report_catalog.reconcile(scan_reports())
+    print(f"Catalogued {n} reports")
+
+if report_catalog.created:
+    report_catalog.reconcile(scan_reports())
+
+# item-level statistics over all stored responses, folded in incrementally
+item_stats = ItemStatistics(SCORING, ITEM_STATS_CACHE, SCORING_VERSION)
+
+@app.cli.command("item-stats")
+@click.option("--json", "json_path", type=click.Path(dir_okay=False), help="also write the full report here")
+def item_stats_command(json_path):
+    """Print Cronbach's alpha per section and item-total correlations per question."""
+    item_stats.update(store)
+    report = item_stats.report()
+    print(f"{report['responses']} responses")
+    for sec, st in report["sections"].items():
+        print(f"{sec}: alpha={st['alpha']} mean={st['total_mean']} sd={st['total_sd']}")
+    for item in report["items"]:
+        print(f"Q{item['question']:>2} mean={item['mean']} difficulty={item['difficulty']} "
+              f"r_it={item['item_total_r']} alpha_if_deleted={item['alpha_if_deleted']} {item['options']}")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+@app.cli.command("profile")
+@click.option("--rate", type=float, default=0.05, show_default=True, help="share of matching requests to profile")
+@click.option("--endpoint", "endpoints", multiple=True, help="Flask endpoint, e.g. submit; repeatable, default all")
+@click.option("--off", is_flag=True, help="stop profiling")
+def profile_command(rate, endpoints, off):
+    """Switch the sampling profiler on or off in every worker."""
+    profiler.configure(0 if off else rate, endpoints)
+    print("Profiling off" if off else f"Profiling {rate:.0%} of requests to {', '.join(endpoints) or 'all endpoints'}")
+
+@app.cli.command("profile-report")
+@click.option("--endpoint", default=None, help="only this endpoint")
+@click.option("--sort", default="cumulative", show_default=True)
+@click.option("--limit", default=30, show_default=True)
+@click.option("--clear", is_flag=True, help="delete the collected profiles afterwards")
+def profile_report_command(endpoint, sort, limit, clear):
+    """Print the merged profile collected by the sampling profiler."""
+    if not profiler.report(sys.stdout, endpoint, sort, limit):
+        print("No profiles collected")
+    if clear:
+        profiler.clear(endpoint)
+
+@app.cli.command("metrics-reset")
+def metrics_reset_command():
+    """Zero the counters and histograms served on /metrics."""
+    metrics.reset()
+
+@app.cli.command("send-mail")
+@click.option("--once", is_flag=True, help="send what is due now and exit")
+def send_mail_command(once):
+    """Send queued student report emails (for running the senders outside the web workers)."""
+    if not SMTP_HOST:
+        raise click.UsageError("SMTP_HOST is not set")
+    n = 0
+    while True:
+        sent = mail_queue.send_batch()
+        n += sent
+        mail_queue.prune_if_due()
+        if not sent:
+            if once:
+                break
+            time.sleep(mail_queue.poll_interval)
+    mail_queue.pool.close()
+    print(f"Processed {n} messages: {mail_queue.stats()}")
+
+@app.cli.command("mail-status")
+@click.option("--retry-dead", is_flag=True, help="requeue every dead letter")
+def mail_status_command(retry_dead):
+    """Show the email queue and its dead letters."""
+    if retry_dead:
+        print(f"Requeued {mail_queue.retry_dead()} dead letters")
+    print(mail_queue.stats())
+    for m in mail_queue.dead_letters(limit=50):
+        print(f"#{m['id']} {m['recipient']} attempts={m['attempts']} queued={m['created_at']} {m['error']}")
+
+@app.cli.command("rebuild-analytics")
+def rebuild_analytics_command():
+    """Recompute the cohort analytics from every stored submission."""
+    analytics.rebuild(store.iter_all())
+    print(f"Rebuilt analytics for {analytics.summary()['count']} submissions")
+
+@app.cli.command("import-csv")
+def import_csv_command():
+    """Import an existing submissions.csv into the submissions store."""
+    if not CSV_FILE.exists():
+        print(f"{CSV_FILE} not found")
+        return
+    n = store.import_csv(CSV_FILE)
+    analytics.rebuild(store.iter_all())
+    print(f"Imported {n} submissions from {CSV_FILE}")
+
+@app.cli.command("rescore")
+def rescore_command():
+    """Re-score every stored submission with the current answer key and section bands."""
+    def flush(recs):
+        result = SCORING.score(SCORING.encode_packed(r["answers"] for r in recs))
+        store.update_scores((r["id"], int(total), float(pct), [int(v) for v in totals])
+                            for r, total, pct, totals in zip(recs, result.total, result.percentage, result.section_totals))
+    chunk, n = [], 0
+    for rec in store.iter_all():
+        if rec["answers"] is None:
+            continue
+        chunk.append(rec)
+        if len(chunk) >= 5000:
+            flush(chunk); n += len(chunk); chunk = []
+    if chunk:
+        flush(chunk); n += len(chunk)
+    analytics.rebuild(store.iter_all())
+    print(f"Re-scored {n} submissions (scoring version {SCORING_VERSION})")
+
+@app.cli.command("export-reports")
+@click.option("--department", default="")
+@click.option("--class-section", default="")
+@click.option("--since", default="", help="first submission date, YYYY-MM-DD")
+@click.option("--until", default="", help="last submission date, YYYY-MM-DD")
+@click.option("--format", "fmt", type=click.Choice(["zip", "pdf"]), default="zip")
+@click.option("--workers", type=int, default=EXPORT_WORKERS)
+@click.option("-o", "--output", required=True, type=click.Path(dir_okay=False))
+def export_reports_command(department, class_section, since, until, fmt, workers, output):
+    """Export the teacher reports of a cohort as a ZIP or one merged PDF."""
+    try:
+        filters = export_filters(department, class_section, since, until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    size = 0
+    with open(output, "wb") as f:
+        for chunk in export_teacher_reports(fmt, filters, workers):
+            f.write(chunk)
+            size += len(chunk)
+    print(f"Wrote {output} ({size} bytes)")
+
+def render_ingested(rec):
+    # rec: a stored submission plus its cohort_percentile; runs in the ingest worker processes
+    section_levels = {sec: section_level_and_recommendation(sec, sc) for sec, sc in rec["section_scores"].items()}
+    student_pdf = generate_student_pdf(rec, rec["section_scores"], rec["total"], SCORING.max_total, section_levels,
+                                       rec["cohort_percentile"])
+    metrics.inc("psychometric_pdf_bytes_total", student_pdf.getbuffer().nbytes, kind="student")
+    return student_pdf.getvalue(), teacher_report_bytes(rec)
+
+@app.cli.command("ingest-responses")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--output-dir", default="ingested_reports", show_default=True, type=click.Path(file_okay=False))
+@click.option("--workers", type=int, default=EXPORT_WORKERS)
+@click.option("--chunk", "chunk_size", type=int, default=2000, show_default=True, help="rows per transaction")
+@click.option("--pdfs/--no-pdfs", default=True, help="render the student and teacher reports")
+@click.option("--rejects", type=click.Path(dir_okay=False), help="where invalid rows go; default <file>.rejects.csv")
+@click.option("--restart", is_flag=True, help="ignore the saved checkpoint and start from the first row")
+def ingest_responses_command(path, output_dir, workers, chunk_size, pdfs, rejects, restart):
+    """Score and store a CSV of paper / OMR answer sheets; re-running resumes where it stopped."""
+    try:
+        responses = ResponseFile(path)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    source = str(Path(path).resolve())
+    if restart:
+        store.reset_checkpoint(source)
+    position, pending_from, pending_to = store.checkpoint(source)
+    out = Path(output_dir)
+    if pdfs:
+        (out / "student").mkdir(parents=True, exist_ok=True)
+        (out / "teacher").mkdir(parents=True, exist_ok=True)
+
+    def write_reports(recs):
+        if not pdfs or not recs:
+            return 0
+        ranks = {}
+        for rec in recs:
+            key = (rec["department"], rec["total"])
+            if key not in ranks:
+                rank, cohort_size = analytics.percentile_rank("department", rec["department"], TOTAL, rec["total"])
+                ranks[key] = (rec["department"], rank) if cohort_size >= PERCENTILE_MIN_COHORT else None
+            rec["cohort_percentile"] = ranks[key]
+        n = 0
+        for rec, (student_pdf, teacher_pdf) in render_in_order(recs, render_ingested, workers=workers):
+            (out / "student" / f"Student_Report_{safe_filename(rec['name'] or 'Unknown')}_{rec['id']}.pdf").write_bytes(student_pdf)
+            (out / "teacher" / teacher_report_filename(rec)).write_bytes(teacher_pdf)
+            n += 2
+        return n
+
+    progress = Progress(responses.count(), position)
+    if pending_from is not None:
+        # stored by the previous run, which stopped before their reports were written
+        progress.update(pdfs=write_reports(store.get_range(pending_from, pending_to)))
+        store.clear_pending(source)
+    rejects = Path(rejects or f"{path}.rejects.csv")
+    # a resumed run adds to the rejects of the rows before it; a restart starts them over
+    with open(rejects, "w" if restart else "a", newline="", encoding="utf-8") as f:
+        reject_writer = csv.writer(f)
+        if f.tell() == 0:
+            reject_writer.writerow(responses.header + ["row", "error"])
+        for chunk in chunked(responses.rows(skip=position), chunk_size):
+            valid = [r for r in chunk if not r[4]]
+            for pos, _, _, _, error, row in chunk:
+                if error:
+                    reject_writer.writerow(row + [pos, error])
+            f.flush()
+            rows = []
+            if valid:
+                result = SCORING.score(SCORING.encode_many(answers for _, _, _, answers, _, _ in valid))
+                # rows without a timestamp are stamped with the ingest time; the file and row
+                # number, not the timestamp, are what keep a row from being stored twice
+                now = datetime.now().isoformat()
+                rows = [(timestamp or now, info, int(total), float(pct),
+                         {sec: int(v) for sec, v in zip(SCORING.sections, totals)}, pack_answers(answers),
+                         f"{source}#{pos}")
+                        for (pos, info, timestamp, answers, _, _), total, pct, totals
+                        in zip(valid, result.total, result.percentage, result.section_totals)]
+            # the checkpoint commits with the rows, so a resumed run carries on after them
+            ids = store.add_many(rows, checkpoint=(source, chunk[-1][0]))
+            new = [row for i, row in zip(ids, rows) if i is not None]
+            analytics.record_many((info, section_scores, total) for _, info, total, _, section_scores, _, _ in new)
+            metrics.inc("psychometric_submissions_total", len(new))
+            stored = [i for i in ids if i is not None]
+            written = write_reports(store.get_range(stored[0], stored[-1])) if stored else 0
+            store.clear_pending(source)
+            progress.update(len(chunk), len(chunk) - len(valid), len(rows) - len(new), written)
+    print(progress.summary())
+    print(f"Rejected rows are in {rejects}" if progress.rejected else "No rejected rows")
+
+def question_bank_version():
+    return hashlib.sha1(repr((LIKERT_QUESTIONS, MCQ_QUESTIONS)).encode()).hexdigest()
+
+def index_template_uptodate():
+    # only consulted while Flask reloads templates (debug / TEMPLATES_AUTO_RELOAD)
+    if not app.jinja_env.auto_reload:
+        return None
+    return app.jinja_loader.get_source(app.jinja_env, "index.html")[2]
+
+# the test page is identical for every student: rendered once per question-bank version
+test_page = RenderedPage(
+    lambda: render_template("index.html", likert_questions=LIKERT_QUESTIONS, mcq_questions=[q for q,_ in MCQ_QUESTIONS]),
+    question_bank_version, index_template_uptodate)
+
+@app.cli.command("export-submissions")
+@click.option("--format", "fmt", type=click.Choice(sorted(FORMATS)), default="csv", show_default=True)
+@click.option("--department", default="")
+@click.option("--class-section", default="")
+@click.option("--since", default="", help="YYYY-MM-DD, inclusive")
+@click.option("--until", default="", help="YYYY-MM-DD, inclusive")
+@click.option("--columns", default="", help="comma-separated subset, e.g. rollno,name,total")
+@click.option("-o", "--output", required=True, type=click.Path(dir_okay=False))
+def export_submissions_command(fmt, department, class_section, since, until, columns, output):
+    """Export submissions as CSV, JSONL or Parquet."""
+    try:
+        filters = export_filters(department, class_section, since, until)
+        chunks = stream_export(store, fmt, parse_columns(store, columns), filters)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    size = 0
+    with open(output, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    print(f"Wrote {output} ({size} bytes)")
 
 @app.route("/", methods=["GET"])
 def index():
-    return render_template("index.html", likert_questions=LIKERT_QUESTIONS, mcq_questions=[q for q,_ in MCQ_QUESTIONS])
+    page = test_page.get(request.accept_encodings)
+    response = Response(page.body, mimetype="text/html")
+    if page.encoding:
+        response.headers["Content-Encoding"] = page.encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(page.etag)
+    return response.make_conditional(request)
+
+drafts = DraftStore(DRAFTS_DB, ttl=DRAFT_TTL_HOURS * 3600, max_drafts=DRAFT_MAX)
+STUDENT_FIELDS = ("studentName", "rollNumber", "department", "classSection", "studentEmail")
+
+def draft_delta_error(delta):
+    # a delta holds test form fields only: student fields as text, answers as an option or "" to clear
+    if not isinstance(delta, dict) or len(delta) > len(STUDENT_FIELDS) + QUESTION_COUNT:
+        return "Expected an object of form fields."
+    for name, value in delta.items():
+        if not isinstance(value, str):
+            return f"Invalid value for {name}."
+        if name in STUDENT_FIELDS:
+            if len(value) > 200:
+                return f"{name} is too long."
+        elif name.startswith("q") and name[1:].isdigit() and 1 <= int(name[1:]) <= QUESTION_COUNT:
+            if value and not valid_answer(int(name[1:]), value):
+                return f"Invalid answer for question {name[1:]}."
+        else:
+            return f"Unknown field {name}."
+    return None
+
+@app.route("/draft", methods=["POST"])
+def create_draft():
+    token = drafts.create()
+    if token is None:
+        # every slot holds a live draft; the page keeps its answers and submits the full form
+        metrics.inc("psychometric_shed_total", route=request.endpoint)
+        return jsonify(error="Too many tests in progress to save drafts right now."), 503, {"Retry-After": "60"}
+    return jsonify(token=token, ttl=drafts.ttl), 201
+
+@app.route("/draft/<token>", methods=["GET"])
+def get_draft(token):
+    fields = drafts.get(token)
+    if fields is None:
+        return jsonify(error="Draft not found or expired."), 404
+    return jsonify(fields=fields, ttl=drafts.ttl)
+
+@app.route("/draft/<token>", methods=["PATCH"])
+def update_draft(token):
+    # body: {"fields": {"q7": "4", "studentName": "..."}}, only what changed since the last save
+    body = request.get_json(silent=True)
+    delta = body.get("fields") if isinstance(body, dict) else None
+    error = draft_delta_error(delta)
+    if error:
+        return jsonify(error=error), 400
+    fields = drafts.update(token, delta)
+    if fields is None:
+        return jsonify(error="Draft not found or expired."), 404
+    answered = sum(1 for name in fields if name not in STUDENT_FIELDS)
+    return jsonify(answered=answered, missing=QUESTION_COUNT - answered)
+
+submit_gate = AdmissionGate(SUBMIT_CONCURRENCY, SUBMIT_QUEUE, SUBMIT_QUEUE_TIMEOUT)
+
+def admission_controlled(gate):
+    # runs the view once `gate` admits the request, else answers 503 with Retry-After
+    from functools import wraps
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with metrics.stage("admission_wait"):
+                admitted = gate.acquire()
+            if not admitted:
+                metrics.inc("psychometric_shed_total", route=request.endpoint)
+                return Response("The server is busy right now. Please go back and submit again in a few seconds.",
+                                status=503, headers={"Retry-After": str(gate.retry_after())}, mimetype="text/plain")
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                gate.release(time.perf_counter() - start)
+        return wrapper
+    return decorator
 
 @app.route("/submit", methods=["POST"])
+@admission_controlled(submit_gate)
 def submit():
-    student_info = {
-        "name": request.form.get("studentName","").strip(),
-        "rollno": request.form.get("rollNumber","").strip(),
-        "department": request.form.get("department","").strip(),
-        "classSection": request.form.get("classSection","").strip(),
-        "email": request.form.get("studentEmail","").strip()
-    }
-    # gather answers
-    answers = {}
-    for i in range(1,51):
-        val = request.form.get(f"q{i}")
-        if val is None:
-            return "Please answer all questions before submitting.", 400
-        answers[str(i)] = val
+    with metrics.stage("parse_form"):
+        # with a draft token the form only needs what the draft does not hold yet
+        form, draft = request.form, None
+        draft_token = request.form.get("draftToken", "")
+        if draft_token:
+            draft = drafts.get(draft_token)
+            if draft is not None:
+                form = {**draft, **request.form.to_dict()}
+        student_info = {
+            "name": form.get("studentName","").strip(),
+            "rollno": form.get("rollNumber","").strip(),
+            "department": form.get("department","").strip(),
+            "classSection": form.get("classSection","").strip(),
+            "email": form.get("studentEmail","").strip()
+        }
+        # gather answers
+        answers, error = read_answers(lambda i: form.get(f"q{i}"))
+        if error:
+            if draft_token and draft is None:
+                # the draft expired and the posted form does not hold every answer on its own
+                return "Your saved answers have expired. Please submit the full form again.", 410
+            return error, 400
     # compute
-    section_scores, total, max_total, per_q_scores = compute_scores(answers)
-    # section levels
-    section_levels = {}
-    for sec, sc in section_scores.items():
-        lvl, rec = section_level_and_recommendation(sec, sc)
-        section_levels[sec] = (lvl, rec)
-    # generate student pdf
-    student_pdf = generate_student_pdf(student_info, section_scores, total, max_total, section_levels)
-    # save teacher pdf to server
-    teacher_pdf_path = generate_teacher_pdf(student_info, section_scores, total, max_total, per_q_scores, answers)
-    # append CSV
-    row = [datetime.now().isoformat(), student_info["name"], student_info["rollno"], student_info["department"], student_info["classSection"], student_info["email"], total, round((total/max_total)*100,2)]
-    for sec in SECTION_MAP.keys():
-        row.append(section_scores.get(sec,0))
-    with open(CSV_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+    with metrics.stage("compute_scores"):
+        section_scores, total, max_total, per_q_scores = compute_scores(answers)
+        # section levels
+        section_levels = {}
+        for sec, sc in section_scores.items():
+            lvl, rec = section_level_and_recommendation(sec, sc)
+            section_levels[sec] = (lvl, rec)
+    # record submission with packed raw answers; the teacher report is rendered on download
+    submitted_at = datetime.now()
+    with metrics.stage("store_submission"):
+        submission_id = store.add(submitted_at.isoformat(), student_info, total, round((total/max_total)*100,2),
+                                  section_scores, pack_answers(answers))
+    metrics.inc("psychometric_submissions_total")
+    if draft_token:
+        drafts.delete(draft_token)
+    with metrics.stage("update_analytics"):
+        analytics.record(student_info, section_scores, total)
+    if PREWARM_TEACHER_REPORTS:
+        render_queue.enqueue("teacher_pdf", {"submission_id": submission_id})
+    # generate student pdf, with the department percentile once the cohort is big enough
+    with metrics.stage("percentile_rank"):
+        rank, cohort_size = analytics.percentile_rank("department", student_info["department"], TOTAL, total)
+    cohort_percentile = (student_info["department"], rank) if cohort_size >= PERCENTILE_MIN_COHORT else None
+    with metrics.stage("generate_student_pdf"):
+        student_pdf = generate_student_pdf(student_info, section_scores, total, max_total, section_levels, cohort_percentile)
+    metrics.inc("psychometric_pdf_bytes_total", student_pdf.getbuffer().nbytes, kind="student")
+    fname = f"Student_Report_{student_info['name'].replace(' ','_')}.pdf"
+    # a copy by email, sent in the background, so a lost download does not mean retaking the test
+    with metrics.stage("queue_email"):
+        queue_student_report(student_info, student_pdf.getvalue(), fname)
     # return student pdf for immediate download
     student_pdf.seek(0)
-    fname = f"Student_Report_{student_info['name'].replace(' ','_')}.pdf"
     return send_file(student_pdf, as_attachment=True, download_name=fname, mimetype="application/pdf")
 
 # Teacher panel
@@ -412,15 +1024,105 @@ def teacher_logout():
 @app.route("/teacher/dashboard")
 @teacher_required
 def teacher_dashboard():
-    reports = sorted(DATA_DIR.glob("TeacherReport_*.pdf"), key=lambda p: p.stat().st_mtime, reverse=True)
-    recent = []
-    if CSV_FILE.exists():
-        with open(CSV_FILE, newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            header = next(reader, None)
-            for row in reader:
-                recent.append(row)
-    return render_template("teacher_dashboard.html", reports=reports, recent=recent[:50])
+    report_filters = {k: request.args.get(k, "").strip() for k in ("q", "report_department")}
+    with metrics.stage("dashboard_reports"):
+        try:
+            reports = report_catalog.page(limit=25, before=request.args.get("reports_before") or None,
+                                          department=report_filters["report_department"], search=report_filters["q"])
+        except ValueError:
+            return "Invalid reports cursor.", 400
+    older_reports = report_catalog.cursor(reports[-1]) if len(reports) == 25 else None
+    for r in reports:
+        r["written"] = datetime.fromtimestamp(r["mtime"]).strftime("%Y-%m-%d %H:%M")
+    filters = {k: request.args.get(k, "").strip() for k in ("department", "classSection", "rollno")}
+    before = request.args.get("before", type=int)
+    # reads the recent submissions (formerly the whole submissions.csv)
+    with metrics.stage("dashboard_submissions"):
+        page = store.page(limit=50, before=before, **filters)
+    older = page[-1]["id"] if len(page) == 50 else None
+    with metrics.stage("dashboard_analytics"):
+        cohort = analytics.summary(*analytics_scope(filters))
+    with metrics.stage("dashboard_render"):
+        return render_template("teacher_dashboard.html", reports=reports, report_filters=report_filters,
+                               older_reports=older_reports, header=store.header,
+                               recent=[(r, store.as_row(r)) for r in page], filters=filters, older=older,
+                               cohort=cohort, job_stats=render_queue.stats(), jobs=render_queue.recent(),
+                               mail_enabled=bool(SMTP_HOST), mail_stats=mail_queue.stats(),
+                               dead_letters=mail_queue.dead_letters())
+
+def analytics_scope(filters):
+    # narrowest cohort the dashboard filters select
+    if filters.get("classSection"):
+        return "classSection", filters["classSection"]
+    if filters.get("department"):
+        return "department", filters["department"]
+    return "all", ""
+
+@app.route("/teacher/analytics.json")
+@teacher_required
+def teacher_analytics():
+    scope = request.args.get("scope", "all")
+    if scope not in ("all", "department", "classSection"):
+        return jsonify(error="scope must be all, department or classSection"), 400
+    summary = analytics.summary(scope, "" if scope == "all" else request.args.get("cohort", "").strip())
+    summary["cohorts"] = {s: analytics.cohorts(s) for s in ("department", "classSection")}
+    return jsonify(summary)
+
+@app.route("/teacher/item-stats.json")
+@teacher_required
+def teacher_item_stats():
+    item_stats.update(store)
+    return jsonify(item_stats.report())
+
+export_slots = SharedSlots(str(DATA_DIR / "export_slots"), EXPORT_CONCURRENCY)
+
+@app.route("/teacher/export")
+@teacher_required
+def teacher_export():
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "pdf"):
+        return "Unknown export format.", 400
+    try:
+        filters = export_filters(request.args.get("department", ""), request.args.get("classSection", ""),
+                                 request.args.get("since", ""), request.args.get("until", ""))
+    except ValueError:
+        return "Dates must be YYYY-MM-DD.", 400
+    name = "_".join(v for v in ("TeacherReports", filters["department"], filters["classSection"]) if v)
+    name = "".join(ch for ch in name if ch.isalnum() or ch in "_-")
+    mimetype = "application/pdf" if fmt == "pdf" else "application/zip"
+    slot = export_slots.acquire()
+    if slot is None:
+        metrics.inc("psychometric_shed_total", route=request.endpoint)
+        return Response("Another cohort export is running. Please try again in a minute.", status=503,
+                        headers={"Retry-After": "60"}, mimetype="text/plain")
+    # the slot is held until the download has been streamed (or abandoned)
+    try:
+        response = Response(export_teacher_reports(fmt, filters), mimetype=mimetype,
+                            headers={"Content-Disposition": f"attachment; filename={name}.{fmt}"})
+    except Exception:
+        export_slots.release(slot)
+        raise
+    response.call_on_close(lambda: export_slots.release(slot))
+    return response
+
+@app.route("/teacher/mail/retry", methods=["POST"])
+@teacher_required
+def teacher_retry_mail():
+    # one dead letter (message_id) or all of them
+    message_id = request.form.get("message_id", type=int)
+    n = mail_queue.retry_dead([message_id] if message_id else None)
+    flash(f"Requeued {n} emails")
+    return redirect(url_for("teacher_dashboard"))
+
+@app.route("/teacher/download/<int:submission_id>")
+@teacher_required
+def teacher_download_report(submission_id):
+    path = render_teacher_report(submission_id)
+    if path is None:
+        flash("No stored answers for this submission")
+        return redirect(url_for("teacher_dashboard"))
+    return send_file(str(path), as_attachment=True, download_name=teacher_report_filename(store.get(submission_id)),
+                     mimetype="application/pdf")
 
 @app.route("/teacher/download/<path:filename>")
 @teacher_required
@@ -434,10 +1136,63 @@ def teacher_download(filename):
 @app.route("/teacher/download_csv")
 @teacher_required
 def teacher_download_csv():
-    if not CSV_FILE.exists():
-        flash("No CSV available")
-        return redirect(url_for("teacher_dashboard"))
-    return send_file(str(CSV_FILE), as_attachment=True, download_name="submissions.csv", mimetype="text/csv")
+    return Response(stream_with_context(stream_export(store, "csv", store.header, {})), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=submissions.csv"})
+
+@app.route("/teacher/export/submissions")
+@teacher_required
+def teacher_export_submissions():
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        return "Unknown export format.", 400
+    try:
+        filters = export_filters(request.args.get("department", ""), request.args.get("classSection", ""),
+                                 request.args.get("since", ""), request.args.get("until", ""))
+    except ValueError:
+        return "Dates must be YYYY-MM-DD.", 400
+    try:
+        columns = parse_columns(store, request.args.get("columns", ""))
+        stream_export(store, fmt, columns, filters)
+    except ValueError as e:
+        return str(e), 400
+    # pin the snapshot so a resumed download sees exactly the same rows
+    filters["upto"] = request.args.get("upto", type=int)
+    if filters["upto"] is None:
+        filters["upto"] = store.max_id()
+    pinned = url_for("teacher_export_submissions", **{**request.args.to_dict(), "upto": filters["upto"]})
+    etag = hashlib.sha1(json.dumps([fmt, columns, filters, SCORING_VERSION]).encode()).hexdigest()[:20]
+    headers = {"Content-Disposition": f"attachment; filename=submissions.{fmt}", "Accept-Ranges": "bytes",
+               "Content-Location": pinned, "ETag": f'"{etag}"', "X-Export-Upto": str(filters["upto"])}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    ranges = request.range
+    if ranges is not None and len(ranges.ranges) == 1 and (request.if_range.etag in (None, etag)) \
+            and request.if_range.date is None:
+        # resuming: one pass to learn the length, then stream just the requested slice
+        length = sum(len(chunk) for chunk in stream_export(store, fmt, columns, filters))
+        span = ranges.range_for_length(length)
+        if span is None:
+            return Response(status=416, headers={**headers, "Content-Range": f"bytes */{length}"})
+        start, stop = span
+        headers.update({"Content-Range": f"bytes {start}-{stop - 1}/{length}", "Content-Length": str(stop - start)})
+        return Response(stream_with_context(byte_range(stream_export(store, fmt, columns, filters), start, stop)),
+                        status=206, mimetype=FORMATS[fmt], headers=headers)
+    return Response(stream_with_context(stream_export(store, fmt, columns, filters)), mimetype=FORMATS[fmt],
+                    headers=headers)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return "Unauthorized", 401
+    jobs = [({"status": status}, n) for status, n in render_queue.stats().items()]
+    emails = [({"status": status}, n) for status, n in mail_queue.stats().items()]
+    draft_stats = drafts.stats()
+    return Response(metrics.render(extra=[("psychometric_render_jobs", "gauge", "Render queue jobs by status.", jobs),
+                                          ("psychometric_emails", "gauge", "Student report emails by status.", emails),
+                                          ("psychometric_drafts", "gauge", "Saved test drafts.", [({}, draft_stats["count"])]),
+                                          ("psychometric_draft_bytes", "gauge", "Size of the saved test drafts.",
+                                           [({}, draft_stats["bytes"])])]),
+                    mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=int(os.environ.get("PORT",5000)))
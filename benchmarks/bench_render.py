@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Micro-benchmarks for the submission pipeline: compute_scores (one row and batched),
+# generate_student_pdf, generate_teacher_pdf, and paragraph layout against the old
+# word-by-word measuring. Times are per call, in ms.
+#   python benchmarks/bench_render.py [--iterations N] [--json out.json]
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from reportlab.pdfgen import canvas  # noqa: E402
+
+from benchlib import summarize, write_json  # noqa: E402
+
+
+def sample_answers(rng):
+    answers = {str(q): str(rng.randint(1, 5)) for q in range(1, 41)}
+    answers.update({str(q): rng.choice("ABCD") for q in range(41, 51)})
+    return answers
+
+
+def naive_paragraph(c, text, x, y, max_width, leading=12, fontname="Helvetica", fontsize=10):
+    # the original layout: re-measures the whole candidate line for every word
+    words = text.split()
+    lines, line = [], []
+    for w in words:
+        if c.stringWidth(" ".join(line + [w]), fontname, fontsize) <= max_width:
+            line.append(w)
+        else:
+            lines.append(line)
+            line = [w]
+    if line:
+        lines.append(line)
+    for idx, line_words in enumerate(lines):
+        if idx != len(lines) - 1 and line_words:
+            extra = max_width - sum(c.stringWidth(w, fontname, fontsize) for w in line_words)
+            space_width = extra / (len(line_words) - 1 if len(line_words) > 1 else 1)
+            cur_x = x
+            for w in line_words:
+                c.drawString(cur_x, y, w)
+                cur_x += c.stringWidth(w, fontname, fontsize) + space_width
+        elif line_words:
+            c.drawString(x, y, " ".join(line_words))
+        y -= leading
+    return y
+
+
+def timed(fn, iterations, per_call=1):
+    # per_call: how many items one fn() call handles, for batched benchmarks
+    fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000 / per_call)
+    return summarize(samples)
+
+
+def run(iterations):
+    import app
+    rng = random.Random(1)
+    answers = sample_answers(rng)
+    info = {"name": "Bench Student", "rollno": "R001", "department": "CSE", "classSection": "A"}
+    section_scores, total, max_total, per_q = app.compute_scores(answers)
+    levels = {sec: app.section_level_and_recommendation(sec, sc) for sec, sc in section_scores.items()}
+    paragraphs = [app.overall_level_and_recommendation(p)[1] for p in (90, 75, 60, 45, 10)]
+    batch = app.SCORING.encode_many([sample_answers(rng) for _ in range(1000)])
+
+    def paragraphs_with(draw):
+        c = canvas.Canvas(os.devnull)
+        for text in paragraphs:
+            draw(c, text, 50, 700, 480, leading=12, fontsize=10)
+
+    results = {
+        "compute_scores": timed(lambda: app.compute_scores(answers), iterations),
+        "compute_scores_batch_row": timed(lambda: app.SCORING.score(batch), iterations, per_call=len(batch)),
+        "student_pdf": timed(lambda: app.generate_student_pdf(info, section_scores, total, max_total, levels),
+                             iterations),
+        "teacher_pdf": timed(lambda: app.generate_teacher_pdf(info, section_scores, total, max_total, per_q, answers),
+                             iterations),
+        "paragraphs_naive": timed(lambda: paragraphs_with(naive_paragraph), iterations),
+        "paragraphs": timed(lambda: paragraphs_with(app.draw_paragraph_justified), iterations),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # app.py creates its databases and report directories in the working directory,
+    # so it runs in a scratch one that is removed afterwards
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench-render-") as workdir:
+        os.chdir(workdir)
+        try:
+            results = run(args.iterations)
+        finally:
+            os.chdir(cwd)
+    print(f"{'benchmark':26s} {'mean':>9s} {'p50':>9s} {'p95':>9s} {'p99':>9s}   ms")
+    for name, r in results.items():
+        print(f"{name:26s} {r['mean_ms']:9.3f} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f}")
+    if args.json:
+        write_json(args.json, results, benchmark="render", iterations=args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Shared by the benchmark scripts: percentile summaries and the run metadata stored
+# with every result file, so results from two commits can be compared (compare.py).
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(sorted_samples, q):
+    # nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return None
+    return sorted_samples[max(0, math.ceil(q / 100 * len(sorted_samples)) - 1)]
+
+
+def summarize(samples_ms):
+    samples = sorted(samples_ms)
+    if not samples:
+        return {"count": 0}
+    return {"count": len(samples), "mean_ms": round(sum(samples) / len(samples), 4),
+            "p50_ms": round(percentile(samples, 50), 4), "p95_ms": round(percentile(samples, 95), 4),
+            "p99_ms": round(percentile(samples, 99), 4), "max_ms": round(samples[-1], 4)}
+
+
+def run_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "time": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def write_json(path, results, **config):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"run": run_info(), "config": config, "results": results}, f, indent=2)
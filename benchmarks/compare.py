@@ -0,0 +1,40 @@
+import argparse
+import json
+
+# Compares two result files written by bench_render.py or load_test.py (--json) and
+# flags latencies that got slower, or throughput that dropped, by more than --threshold.
+#   python benchmarks/compare.py before.json after.json [--threshold 10]
+
+LATENCY = ("mean_ms", "p50_ms", "p95_ms", "p99_ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"before: {before['run'].get('commit')}  after: {after['run'].get('commit')}")
+
+    regressions = 0
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if not old:
+            continue
+        for key in LATENCY + ("throughput_rps",):
+            if old.get(key) is None or new.get(key) is None or not old[key]:
+                continue
+            change = (new[key] - old[key]) / old[key] * 100
+            worse = change > args.threshold if key in LATENCY else change < -args.threshold
+            regressions += worse
+            print(f"{name:26s} {key:15s} {old[key]:10.3f} -> {new[key]:10.3f} {change:+7.1f}%{'  REGRESSION' if worse else ''}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import http.client
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+# Load generator for the submission pipeline: fires N synthetic /submit and
+# /teacher/dashboard requests, C at a time, and reports throughput and latency
+# percentiles per route. By default it starts gunicorn with the repo's gunicorn.conf.py
+# (the deployed settings) on a free loopback port, with its data files in a temporary
+# directory; --url targets a server that is already up. 503s from /submit's admission
+# gate are counted as shed, not as errors: the test page retries those by itself.
+#   python benchmarks/load_test.py [--requests N] [--concurrency C] [--workers W] [--json out.json]
+
+from benchlib import ROOT, summarize, write_json
+
+DEPARTMENTS = ["CSE", "ECE", "EEE", "MECH", "CIVIL", "IT"]
+
+
+def synthetic_form(rng, n):
+    form = {"studentName": f"Load Student {n}", "rollNumber": f"LT{n:07d}", "department": rng.choice(DEPARTMENTS),
+            "classSection": rng.choice("ABC"), "studentEmail": f"load{n}@example.com"}
+    form.update({f"q{q}": str(rng.randint(1, 5)) for q in range(1, 41)})
+    form.update({f"q{q}": rng.choice("ABCD") for q in range(41, 51)})
+    return urlencode(form)
+
+
+class Client:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookie = None
+
+    def request(self, method, path, body=None, headers=None):
+        # a fresh connection per request, as a browser submitting the test page would
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            return resp.status, resp.getheader("Set-Cookie"), len(data)
+        finally:
+            conn.close()
+
+    def login(self, user, password):
+        status, cookie, _ = self.request("POST", "/teacher/login", urlencode({"user": user, "pwd": password}),
+                                         {"Content-Type": "application/x-www-form-urlencoded"})
+        if status != 302 or not cookie:
+            raise SystemExit(f"teacher login failed with HTTP {status}")
+        self.cookie = cookie.split(";", 1)[0]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, port, workdir):
+    # the app and the deployed gunicorn settings come from the repo; its data files
+    # (databases, reports) go to workdir
+    env = dict(os.environ, PYTHONPATH=str(ROOT), TEACHER_USER="loadtest", TEACHER_PASS="loadtest")
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:app", "-c", str(ROOT / "gunicorn.conf.py"),
+                             "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning"],
+                            env=env, cwd=workdir)
+    return proc
+
+
+def wait_until_up(client, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"server exited with code {proc.returncode}")
+        try:
+            client.request("GET", "/teacher/login")
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("server did not come up")
+
+
+def run(client, teacher, requests, concurrency, dashboard_share, seed):
+    rng = random.Random(seed)
+    plan = [("/teacher/dashboard" if rng.random() < dashboard_share else "/submit", synthetic_form(rng, n))
+            for n in range(requests)]
+    samples = {"/submit": [], "/teacher/dashboard": []}
+    errors = {"/submit": 0, "/teacher/dashboard": 0}
+    shed = {"/submit": 0, "/teacher/dashboard": 0}
+    lock = threading.Lock()
+
+    def fire(item):
+        route, form = item
+        start = time.perf_counter()
+        try:
+            if route == "/submit":
+                status, _, _ = client.request("POST", route, form, {"Content-Type": "application/x-www-form-urlencoded"})
+            else:
+                status, _, _ = teacher.request("GET", route)
+        except OSError:
+            status = None
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            if status == 200:
+                samples[route].append(elapsed)
+            elif status == 503:
+                shed[route] += 1
+            else:
+                errors[route] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, plan))
+    wall = time.perf_counter() - start
+
+    results = {}
+    for route in samples:
+        results[route] = summarize(samples[route])
+        results[route]["errors"] = errors[route]
+        results[route]["shed"] = shed[route]
+        results[route]["throughput_rps"] = round(len(samples[route]) / wall, 2)
+    every = samples["/submit"] + samples["/teacher/dashboard"]
+    results["all"] = summarize(every)
+    results["all"]["errors"] = sum(errors.values())
+    results["all"]["shed"] = sum(shed.values())
+    results["all"]["throughput_rps"] = round(len(every) / wall, 2)
+    results["all"]["wall_s"] = round(wall, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500, help="total requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--dashboard-share", type=float, default=0.1, help="share of requests to the dashboard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="gunicorn workers to start")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--teacher-user", default=os.environ.get("TEACHER_USER", "teacher"))
+    parser.add_argument("--teacher-pass", default=os.environ.get("TEACHER_PASS", "password"))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    proc = workdir = None
+    url = args.url
+    if url is None:
+        workdir = tempfile.mkdtemp(prefix="loadtest-")
+        url = f"http://127.0.0.1:{free_port()}"
+        proc = start_server(args.workers, urlsplit(url).port, workdir)
+        args.teacher_user = args.teacher_pass = "loadtest"
+    try:
+        client, teacher = Client(url), Client(url)
+        wait_until_up(client, proc)
+        teacher.login(args.teacher_user, args.teacher_pass)
+        if args.warmup:
+            run(client, teacher, args.warmup, args.concurrency, args.dashboard_share, args.seed + 1)
+        results = run(client, teacher, args.requests, args.concurrency, args.dashboard_share, args.seed)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'route':20s} {'ok':>6s} {'err':>5s} {'shed':>5s} {'req/s':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}   ms")
+    for route, r in results.items():
+        if r["count"]:
+            print(f"{route:20s} {r['count']:6d} {r['errors']:5d} {r['shed']:5d} {r['throughput_rps']:8.2f} "
+                  f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+        else:
+            print(f"{route:20s} {0:6d} {r['errors']:5d} {r['shed']:5d}")
+    if args.json:
+        write_json(args.json, results, benchmark="load", requests=args.requests, concurrency=args.concurrency,
+                   dashboard_share=args.dashboard_share, workers=None if args.url else args.workers,
+                   url=args.url, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import multiprocessing
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+
+# Bulk cohort export: reports are rendered in a process pool a bounded window at a time
+# and streamed out as they finish, either as a ZIP of PDFs or as one merged PDF, so the
+# export never holds more than a handful of reports in memory.
+
+
+def render_in_order(records, render, cached=None, workers=4, window=None):
+    # yields (record, result) in input order; cached(record) may short-circuit a render
+    window = window or workers * 4
+    if workers <= 1:
+        for rec in records:
+            hit = cached(rec) if cached else None
+            yield rec, hit if hit is not None else render(rec)
+        return
+    # not fork: this often runs in a request thread of a threaded worker, and a forked child
+    # can inherit a lock (metrics, logging) that another thread held at that moment
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver")) as pool:
+        pending = deque()
+        for rec in records:
+            hit = cached(rec) if cached else None
+            pending.append((rec, hit if hit is not None else pool.submit(render, rec)))
+            if len(pending) >= window:
+                rec, res = pending.popleft()
+                yield rec, res if _is_ready(res) else res.result()
+        while pending:
+            rec, res = pending.popleft()
+            yield rec, res if _is_ready(res) else res.result()
+
+
+def _is_ready(res):
+    return not hasattr(res, "result")
+
+
+class ChunkSink:
+    # write-only sink that ZipFile / the PDF writer append to; drained after each report
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_zip(results, filename):
+    # results: (record, pdf bytes); filename(record) -> entry name
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for rec, pdf in results:
+            info = zipfile.ZipInfo(filename(rec), datetime.now().timetuple()[:6])
+            zf.writestr(info, pdf)
+            yield sink.drain()
+    yield sink.drain()
+
+
+@lru_cache(maxsize=None)
+def _page_collector_class():
+    # defined on first use, since it subclasses reportlab's (slow to import) Canvas
+    from reportlab.pdfgen import canvas
+
+    class PageCollector(canvas.Canvas):
+        # canvas that keeps each page's operators for PdfStreamWriter instead of saving a PDF
+        def __init__(self, pagesize=A4):
+            super().__init__(BytesIO(), pagesize=pagesize)
+            self.pages = []
+
+        def showPage(self):
+            self.pages.append("\n".join([self._preamble] + self._code))
+            super().showPage()
+
+        def finish(self):
+            if self._code:
+                self.pages.append("\n".join([self._preamble] + self._code))
+            fonts = {name.lstrip("/"): ps for ps, name in self._doc.fontMapping.items()}
+            return {"pages": self.pages, "fonts": fonts, "pagesize": tuple(self._pagesize)}
+
+    return PageCollector
+
+
+def page_collector(pagesize=A4):
+    return _page_collector_class()(pagesize)
+
+
+class PdfStreamWriter:
+    # minimal incremental PDF writer: objects go out as soon as a page is added and only
+    # the xref offsets are kept, so a merged PDF of any size streams in bounded memory
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, out):
+        self.out = out
+        self.pos = 0
+        self.offsets = {}
+        self.next_id = 3
+        self.font_ids = {}
+        self.kids = []
+        self._write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+
+    def _write(self, data):
+        self.out.write(data)
+        self.pos += len(data)
+
+    def _object(self, body, obj_id=None, stream=None):
+        if obj_id is None:
+            obj_id = self.next_id
+            self.next_id += 1
+        self.offsets[obj_id] = self.pos
+        self._write(f"{obj_id} 0 obj\n{body}\n".encode("latin-1"))
+        if stream is not None:
+            self._write(b"stream\n" + stream + b"\nendstream\n")
+        self._write(b"endobj\n")
+        return obj_id
+
+    def _font(self, ps_name):
+        if ps_name not in self.font_ids:
+            self.font_ids[ps_name] = self._object(
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{ps_name} /Encoding /WinAnsiEncoding >>")
+        return self.font_ids[ps_name]
+
+    def add_pages(self, rendered):
+        # rendered: PageCollector.finish() output for one report
+        from reportlab.lib.rl_accel import fp_str
+        fonts = " ".join(f"/{name} {self._font(ps)} 0 R" for name, ps in sorted(rendered["fonts"].items()))
+        w, h = rendered["pagesize"]
+        for code in rendered["pages"]:
+            data = zlib.compress(code.encode("latin-1"))
+            content = self._object(f"<< /Length {len(data)} /Filter /FlateDecode >>", stream=data)
+            self.kids.append(self._object(
+                f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {fp_str(w)} {fp_str(h)}] "
+                f"/Resources << /Font << {fonts} >> /ProcSet [/PDF /Text] >> /Contents {content} 0 R >>"))
+
+    def close(self):
+        kids = " ".join(f"{k} 0 R" for k in self.kids)
+        self._object(f"<< /Type /Pages /Kids [{kids}] /Count {len(self.kids)} >>", self.PAGES)
+        self._object(f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>", self.CATALOG)
+        xref = self.pos
+        lines = [f"xref\n0 {self.next_id}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[i]:010d} 00000 n \n" for i in range(1, self.next_id)]
+        lines.append(f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._write("".join(lines).encode("latin-1"))
+
+
+def stream_merged_pdf(results):
+    # results: (record, PageCollector.finish() output)
+    sink = ChunkSink()
+    writer = PdfStreamWriter(sink)
+    for _, rendered in results:
+        writer.add_pages(rendered)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
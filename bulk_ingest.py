@@ -0,0 +1,111 @@
+import csv
+import re
+import sys
+import time
+from datetime import datetime
+
+from answer_codec import QUESTION_COUNT, read_answers
+
+# Offline ingest of paper / OMR answer sheets: one CSV row per student, with the student
+# fields and one column per question. Header names are matched loosely (studentName or
+# name, q7 / Q7 / 7, ...) so exports from different scanners work unchanged.
+
+FIELDS = {
+    "name": ("studentname", "name", "student"),
+    "rollno": ("rollnumber", "rollno", "roll", "registerno", "regno"),
+    "department": ("department", "dept"),
+    "classSection": ("classsection", "section", "class"),
+    "email": ("studentemail", "email"),
+    "timestamp": ("timestamp", "submittedat", "date"),
+}
+
+
+def _normalize(header):
+    return re.sub(r"[^a-z0-9]", "", header.lower())
+
+
+class ResponseFile:
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            self.header = next(csv.reader(f), [])
+        normalized = {_normalize(h): i for i, h in enumerate(self.header)}
+        self.fields = {}
+        for field, aliases in FIELDS.items():
+            found = next((normalized[a] for a in aliases if a in normalized), None)
+            if found is not None:
+                self.fields[field] = found
+        self.questions = {}
+        for q in range(1, QUESTION_COUNT + 1):
+            found = next((normalized[a] for a in (f"q{q}", str(q), f"question{q}") if a in normalized), None)
+            if found is not None:
+                self.questions[q] = found
+        missing = [f"q{q}" for q in range(1, QUESTION_COUNT + 1) if q not in self.questions]
+        if missing:
+            raise ValueError(f"{self.path}: missing columns {', '.join(missing)}")
+
+    def count(self):
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+    def rows(self, skip=0):
+        # yields (position, student_info, timestamp or None, answers, error, raw row);
+        # position counts data rows from 1
+        with open(self.path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for position, row in enumerate(reader, start=1):
+                if position <= skip:
+                    continue
+                cell = lambda i: row[i].strip() if i < len(row) else ""
+                info = {field: cell(self.fields[field]) if field in self.fields else ""
+                        for field in FIELDS if field != "timestamp"}
+                timestamp = cell(self.fields["timestamp"]) if "timestamp" in self.fields else None
+                # an empty cell is an unanswered question, as a missing form field is in /submit
+                answers, error = read_answers(lambda q: cell(self.questions[q]) or None)
+                if not error and timestamp:
+                    try:
+                        timestamp = datetime.fromisoformat(timestamp).isoformat()
+                    except ValueError:
+                        error = "Invalid timestamp."
+                yield position, info, timestamp, answers, error, row
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Progress:
+    # one status line per chunk: rows done, rejects, and rows/s and PDFs/s since the start
+    def __init__(self, total, done=0, out=sys.stdout):
+        self.total = total
+        self.start_done = done
+        self.done = done
+        self.rejected = 0
+        self.duplicates = 0
+        self.pdfs = 0
+        self.out = out
+        self.started = time.perf_counter()
+
+    def update(self, rows=0, rejected=0, duplicates=0, pdfs=0):
+        self.done += rows
+        self.rejected += rejected
+        self.duplicates += duplicates
+        self.pdfs += pdfs
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        pct = f" ({self.done / self.total:.0%})" if self.total else ""
+        print(f"{self.done}/{self.total} rows{pct}, {self.rejected} rejected, {self.duplicates} already stored, "
+              f"{(self.done - self.start_done) / elapsed:.0f} rows/s, {self.pdfs / elapsed:.1f} PDFs/s",
+              file=self.out, flush=True)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return (f"Ingested {self.done - self.start_done - self.rejected - self.duplicates} submissions "
+                f"in {elapsed:.1f}s ({self.rejected} rejected, {self.duplicates} already stored, {self.pdfs} PDFs)")
@@ -0,0 +1,120 @@
+import json
+import secrets
+import time
+
+from sqlite_db import connect
+
+# Server-side drafts of in-progress tests: the page sends each change as a small delta of
+# form fields under a random token, and /submit can finish from the stored draft. Drafts
+# live in one small SQLite file so every worker sees the same ones; they expire `ttl`
+# seconds after their last use, and once `max_drafts` live drafts exist no new one is
+# made until some expire, so the store stays bounded however many drafts are started,
+# without ever dropping a student's answers to make room. Point the file at /dev/shm to
+# keep it in memory.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    token TEXT PRIMARY KEY,
+    fields TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS drafts_last_used ON drafts(last_used);
+"""
+
+
+class DraftStore:
+    def __init__(self, db_path, ttl=6 * 3600, max_drafts=5000):
+        self.db_path = str(db_path)
+        self.ttl = ttl
+        self.max_drafts = max_drafts
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def create(self):
+        # token of a new empty draft, or None when max_drafts live drafts already exist
+        token = secrets.token_urlsafe(18)
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM drafts WHERE last_used < ?", (now - self.ttl,))
+            count = conn.execute("SELECT COUNT(*) FROM drafts").fetchone()[0]
+            if count >= self.max_drafts:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("INSERT INTO drafts VALUES (?, '{}', ?)", (token, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return token
+
+    def update(self, token, delta):
+        # merge a {field: value} delta ("" removes the field); returns the whole draft, or
+        # None if the token is unknown or expired
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT fields FROM drafts WHERE token = ? AND last_used >= ?",
+                               (token, now - self.ttl)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            fields = json.loads(row[0])
+            for name, value in delta.items():
+                if value:
+                    fields[name] = value
+                else:
+                    fields.pop(name, None)
+            conn.execute("UPDATE drafts SET fields = ?, last_used = ? WHERE token = ?",
+                         (json.dumps(fields, separators=(",", ":")), now, token))
+            conn.execute("COMMIT")
+            return fields
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, token):
+        # the draft's fields, or None if the token is unknown or expired; counts as a use
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT fields FROM drafts WHERE token = ? AND last_used >= ?",
+                               (token, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE drafts SET last_used = ? WHERE token = ?", (now, token))
+            return json.loads(row[0])
+        finally:
+            conn.close()
+
+    def delete(self, token):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM drafts WHERE token = ?", (token,))
+        finally:
+            conn.close()
+
+    def purge(self):
+        # drop expired drafts; returns how many
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM drafts WHERE last_used < ?", (time.time() - self.ttl,)).rowcount
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(fields)), 0) FROM drafts").fetchone()
+            return {"count": count, "bytes": size, "max_drafts": self.max_drafts}
+        finally:
+            conn.close()
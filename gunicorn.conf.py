@@ -0,0 +1,34 @@
+import gc
+import os
+
+# Production settings for exam-day load. The app is imported once in the master and
+# prewarmed before the workers fork, so they start instantly and share its memory
+# copy-on-write. Threaded workers let /submit's admission gate (SUBMIT_CONCURRENCY,
+# SUBMIT_QUEUE) queue or turn away requests instead of leaving them in the socket
+# backlog until they time out. Settings can be overridden on the command line, and
+# GUNICORN_PRELOAD=0 turns preloading off.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+
+def when_ready(server):
+    # master, after the app was preloaded and before any worker forks
+    if server.cfg.preload_app:
+        import app
+        app.prewarm()
+        # keep the collector from touching (and so copying) the inherited objects
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # without preload each worker imported the app itself; warm it before taking requests
+    import app
+    app.prewarm()
@@ -0,0 +1,114 @@
+import os
+import threading
+
+import numpy as np
+
+from answer_codec import QUESTION_COUNT, options_for, unpack_codes_many
+
+# Item-level psychometrics over every stored response. Only sufficient statistics are
+# kept (response count, per-item score sums, the item x item cross-product matrix and
+# option counts), so new submissions are folded in by decoding just the new rows.
+# Means, difficulty, item-total correlations and Cronbach's alpha all follow from them.
+
+
+class ItemStatistics:
+    def __init__(self, engine, cache_path, version):
+        self.engine = engine
+        self.cache_path = str(cache_path)
+        self.version = version
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.n = 0
+        self.last_id = 0
+        self.sums = np.zeros(QUESTION_COUNT, dtype=np.int64)
+        self.cross = np.zeros((QUESTION_COUNT, QUESTION_COUNT), dtype=np.int64)
+        self.option_counts = np.zeros((QUESTION_COUNT, self.engine.score_table.shape[1]), dtype=np.int64)
+
+    def _load(self):
+        # state saved by any worker is reusable as long as the scoring version matches
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["version"]) != self.version:
+                    return
+                self.n, self.last_id = int(data["n"]), int(data["last_id"])
+                self.sums, self.cross, self.option_counts = data["sums"], data["cross"], data["option_counts"]
+        except (OSError, KeyError, ValueError):
+            self._reset()
+
+    def _save(self):
+        tmp = f"{self.cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, version=self.version, n=self.n, last_id=self.last_id, sums=self.sums,
+                 cross=self.cross, option_counts=self.option_counts)
+        os.replace(tmp, self.cache_path)
+
+    def add(self, codes):
+        # codes: N x 50 answer codes
+        codes = np.asarray(codes, dtype=np.intp)
+        scores = self.engine.score_table[np.arange(QUESTION_COUNT), codes].astype(np.float64)
+        self.n += len(codes)
+        self.sums += scores.sum(axis=0).astype(np.int64)
+        # float matmul goes through BLAS; small integer products stay exact well past 10**15
+        self.cross += np.rint(scores.T @ scores).astype(np.int64)
+        for code in range(self.option_counts.shape[1]):
+            self.option_counts[:, code] += (codes == code).sum(axis=0)
+
+    def update(self, store):
+        # fold in submissions that arrived since the last call; cheap when there are none
+        with self._lock:
+            added = 0
+            for ids, blobs in store.answer_batches(after=self.last_id):
+                self.add(unpack_codes_many(blobs))
+                self.last_id = ids[-1]
+                added += len(ids)
+            if added:
+                self._save()
+            return added
+
+    def report(self):
+        n = self.n
+        items, sections = [], {}
+        if n < 2:
+            return {"responses": n, "items": items, "sections": sections}
+        mean = self.sums / n
+        cov = (self.cross - np.outer(self.sums, self.sums) / n) / (n - 1)
+        var = np.diag(cov)
+        max_score = self.engine.score_table.max(axis=1)
+        item_total_r = np.full(QUESTION_COUNT, np.nan)
+        alpha_if_deleted = np.full(QUESTION_COUNT, np.nan)
+        for s, sec in enumerate(self.engine.sections):
+            idx = np.flatnonzero(self.engine.membership[:, s])
+            block = cov[np.ix_(idx, idx)]
+            total_var = block.sum()
+            k = len(idx)
+            alpha = k / (k - 1) * (1 - var[idx].sum() / total_var) if k > 1 and total_var > 0 else None
+            sections[sec] = {"items": k, "alpha": _round(alpha), "total_mean": _round(mean[idx].sum()),
+                             "total_sd": _round(np.sqrt(total_var))}
+            # corrected item-total correlation: item against the rest of its section
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cov_rest = block.sum(axis=1) - var[idx]
+                var_rest = total_var - 2 * block.sum(axis=1) + var[idx]
+                item_total_r[idx] = cov_rest / np.sqrt(var[idx] * var_rest)
+                if k > 2:
+                    alpha_if_deleted[idx] = (k - 1) / (k - 2) * (1 - (var[idx].sum() - var[idx]) / var_rest)
+        for q in range(QUESTION_COUNT):
+            opts = options_for(q + 1)
+            items.append({
+                "question": q + 1,
+                "section": next(sec for s, sec in enumerate(self.engine.sections) if self.engine.membership[q, s]),
+                "mean": _round(mean[q]),
+                "sd": _round(np.sqrt(var[q])),
+                "difficulty": _round(mean[q] / max_score[q]) if max_score[q] else None,
+                "item_total_r": _round(item_total_r[q]),
+                "alpha_if_deleted": _round(alpha_if_deleted[q]),
+                "options": {opt: int(self.option_counts[q, i]) for i, opt in enumerate(opts)},
+            })
+        return {"responses": n, "items": items, "sections": sections}
+
+
+def _round(value, places=3):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), places)
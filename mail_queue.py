@@ -0,0 +1,221 @@
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.message import EmailMessage
+
+from work_queue import WorkQueue
+
+# Outbound email queue: messages (with their PDF attachment) are WorkQueue rows, and
+# sender threads claim a batch at a time and send it over one SMTP connection taken
+# from a pool, so a burst of submissions costs one login rather than one per student.
+# Permanent failures, and messages out of attempts, stay in the table as dead letters
+# until retried by hand.
+
+SENDING, SENT, DEAD = "sending", "sent", "dead"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    attachment_name TEXT,
+    attachment BLOB,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    locked_at REAL,
+    created_at TEXT NOT NULL,
+    sent_at TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_status_run_after ON messages(status, run_after);
+"""
+
+
+class SMTPPool:
+    # open connections are kept between batches and handed to one sender thread at a time;
+    # a connection idle longer than max_idle, or that has sent max_messages, is replaced
+    def __init__(self, host, port=25, username="", password="", starttls=False, use_ssl=False,
+                 timeout=30, max_idle=60.0, max_messages=500):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._idle = []
+        self._pid = os.getpid()
+        self.connects = 0
+
+    def _open(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self.connects += 1
+        return smtp
+
+    def acquire(self):
+        # returns (smtp, messages sent on it so far)
+        with self._lock:
+            if self._pid != os.getpid():
+                # sockets inherited over fork belong to the parent
+                self._pid, self._idle = os.getpid(), []
+            while self._idle:
+                smtp, last_used, sent = self._idle.pop()
+                if time.monotonic() - last_used < self.max_idle and sent < self.max_messages:
+                    return smtp, sent
+                _quit(smtp)
+        return self._open(), 0
+
+    def release(self, smtp, sent, broken=False):
+        if broken:
+            _close(smtp)
+            return
+        with self._lock:
+            self._idle.append((smtp, time.monotonic(), sent))
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for smtp, _, _ in idle:
+            _quit(smtp)
+
+
+def _quit(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        _close(smtp)
+
+
+def _close(smtp):
+    try:
+        smtp.close()
+    except OSError:
+        pass
+
+
+def _permanent(error):
+    # 5xx replies will not change on retry; 4xx and dropped connections may
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, "smtp_code", None)
+    return code is not None and code >= 500
+
+
+class MailQueue(WorkQueue):
+    table, schema = "messages", SCHEMA
+    active, finished, failed = SENDING, SENT, DEAD
+    thread_name = "mail-sender"
+
+    def __init__(self, db_path, pool, sender, workers=1, batch_size=20, max_pending=5000, max_attempts=5,
+                 retry_delay=30.0, poll_interval=2.0, **options):
+        self.pool = pool
+        self.sender = sender
+        super().__init__(db_path, workers=workers, batch_size=batch_size, max_pending=max_pending,
+                         max_attempts=max_attempts, retry_delay=retry_delay, poll_interval=poll_interval, **options)
+
+    def enqueue(self, recipient, subject, body, attachment=None):
+        # attachment: (filename, pdf bytes); returns the message id, or None when the queue is full
+        name, data = attachment or (None, None)
+        return self._insert({"recipient": recipient, "subject": subject, "body": body,
+                             "attachment_name": name, "attachment": data})
+
+    def _message(self, row):
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = row["recipient"]
+        msg["Subject"] = row["subject"]
+        msg.set_content(row["body"])
+        if row["attachment"] is not None:
+            msg.add_attachment(bytes(row["attachment"]), maintype="application", subtype="pdf",
+                               filename=row["attachment_name"])
+        return msg
+
+    def _deliver(self, rows):
+        # sends rows over one pooled connection; returns {id: None or (error, permanent)}
+        outcome = {}
+        try:
+            smtp, sent = self.pool.acquire()
+        except (smtplib.SMTPException, OSError) as e:
+            # server down or login refused: every message waits for the next attempt
+            return {row["id"]: (f"{type(e).__name__}: {e}", False) for row in rows}
+        broken = False
+        for row in rows:
+            if broken:
+                # not attempted: back in the queue without using up an attempt
+                outcome[row["id"]] = "unsent"
+                continue
+            try:
+                msg = self._message(row)
+            except ValueError as e:
+                # e.g. an address the headers cannot hold
+                outcome[row["id"]] = (f"{type(e).__name__}: {e}", True)
+                continue
+            try:
+                smtp.send_message(msg)
+                sent += 1
+                outcome[row["id"]] = None
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                outcome[row["id"]] = (f"{type(e).__name__}: {e}", _permanent(e))
+                try:
+                    smtp.rset()
+                except (smtplib.SMTPException, OSError):
+                    broken = True
+            except (smtplib.SMTPException, OSError) as e:
+                outcome[row["id"]] = (f"{type(e).__name__}: {e}", False)
+                broken = True
+        self.pool.release(smtp, sent, broken)
+        return outcome
+
+    def _finish(self, conn, rows, outcome):
+        conn.execute("BEGIN IMMEDIATE")
+        for row in rows:
+            result = outcome[row["id"]]
+            if result is None:
+                # the attachment is only needed until delivery
+                self._succeed(conn, row, sent_at=datetime.now().isoformat(), attachment=None)
+            elif result == "unsent":
+                self._requeue(conn, row)
+            else:
+                self._fail(conn, row, result[0], permanent=result[1])
+        conn.execute("COMMIT")
+
+    def send_batch(self):
+        # claim and send up to batch_size messages; returns how many were claimed
+        conn = self._connect()
+        try:
+            rows = self._claim(conn)
+            if rows:
+                self._finish(conn, rows, self._deliver(rows))
+            return len(rows)
+        finally:
+            conn.close()
+
+    def work(self):
+        return self.send_batch()
+
+    def dead_letters(self, limit=20):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, recipient, subject, attempts, created_at, error FROM messages "
+                                "WHERE status = ? ORDER BY id DESC LIMIT ?", (DEAD, limit)).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+    def retry_dead(self, ids=None):
+        # put dead letters (all, or the given ids) back in the queue with fresh attempts
+        return self.retry_failed(ids)
@@ -0,0 +1,341 @@
+import atexit
+import cProfile
+import glob
+import json
+import multiprocessing.util
+import os
+import pstats
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlite_db import connect
+
+# Request and stage instrumentation shared by every gunicorn worker. Each process counts
+# in memory and every few seconds (and when it exits) writes its own totals to one SQLite
+# row per series; /metrics adds the rows of all processes up and renders Prometheus text
+# format. The rows of processes that have exited are folded into one set of RETIRED rows,
+# so counters never go down and the table does not grow as workers are recycled.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    process TEXT NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (process, name, labels)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+COUNTER, HISTOGRAM = "counter", "histogram"
+RETIRED = "retired"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    def __init__(self, db_path, flush_interval=5.0, settings_interval=2.0):
+        # absolute, since the exit flush may run after the working directory changed
+        self.db_path = os.path.abspath(db_path)
+        self.flush_interval = flush_interval
+        self.settings_interval = settings_interval
+        self.kinds = {}
+        self.help = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def describe(self, name, kind, help_text):
+        self.kinds[name] = kind
+        self.help[name] = help_text
+
+    def _local(self):
+        # forked workers start from zero under their own process key; caller holds the lock
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process = f"{self._pid}-{time.time():.6f}"
+            self._values = {}
+            self._dirty = set()
+            self._flushed_at = time.monotonic()
+            self._settings = {}
+            self._settings_at = 0.0
+            # gunicorn workers exit through atexit, multiprocessing children through its finalizers
+            atexit.register(self._flush_at_exit)
+            multiprocessing.util.Finalize(None, self._flush_at_exit, exitpriority=10)
+        return self._values
+
+    def _flush_at_exit(self):
+        if self._pid == os.getpid():
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # e.g. the database is locked past its timeout; nothing left to retry with
+                pass
+
+    def inc(self, name, value=1, **labels):
+        key = (name, json.dumps(sorted(labels.items())))
+        with self._lock:
+            values = self._local()
+            values[key] = values.get(key, 0) + value
+            self._dirty.add(key)
+        self.maybe_flush()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, json.dumps(sorted(labels.items())))
+        with self._lock:
+            values = self._local()
+            hist = values.get(key)
+            if hist is None:
+                hist = values[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+                    break
+            hist["sum"] += seconds
+            hist["count"] += 1
+            self._dirty.add(key)
+        self.maybe_flush()
+
+    @contextmanager
+    def stage(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("psychometric_stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        # serialised so an older snapshot never overwrites a newer one
+        with self._flush_lock:
+            with self._lock:
+                values = self._local()
+                rows = [(self._process, name, labels, json.dumps(values[(name, labels)]))
+                        for name, labels in self._dirty]
+                self._dirty = set()
+                self._flushed_at = time.monotonic()
+            if not rows:
+                return
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)", rows)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+    def collect(self):
+        # totals over every process that ever flushed: {(name, labels): value or histogram}
+        self.flush()
+        conn = self._connect()
+        try:
+            self._retire(conn)
+            rows = conn.execute("SELECT name, labels, data FROM samples").fetchall()
+        finally:
+            conn.close()
+        totals = {}
+        for name, labels, data in rows:
+            _add(totals, (name, labels), json.loads(data))
+        return totals
+
+    def _retire(self, conn):
+        # fold the rows of processes that have exited into the RETIRED rows
+        processes = conn.execute("SELECT DISTINCT process FROM samples WHERE process != ?", (RETIRED,)).fetchall()
+        dead = [p for (p,) in processes if not self._alive(p)]
+        if not dead:
+            return
+        marks = ", ".join("?" * len(dead))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            totals = {}
+            for name, labels, data in conn.execute(
+                    f"SELECT name, labels, data FROM samples WHERE process = ? OR process IN ({marks})",
+                    (RETIRED, *dead)):
+                _add(totals, (name, labels), json.loads(data))
+            conn.execute(f"DELETE FROM samples WHERE process IN ({marks})", dead)
+            conn.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)",
+                             ((RETIRED, name, labels, json.dumps(value)) for (name, labels), value in totals.items()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _alive(self, process):
+        # process keys are "<pid>-<start time>"; a reused pid is told apart by the start time
+        # when it is this process, and otherwise counts as alive until it exits too
+        pid = int(process.split("-", 1)[0])
+        if pid == os.getpid():
+            return process == self._process
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def render(self, extra=()):
+        # Prometheus text exposition format; extra: (name, kind, help, [(labels dict, value)])
+        series = {}
+        for (name, labels), value in sorted(self.collect().items()):
+            series.setdefault(name, []).append((dict(json.loads(labels)), value))
+        lines = []
+        for name in sorted(series):
+            lines += _family(name, self.kinds.get(name, COUNTER), self.help.get(name, ""), series[name])
+        for name, kind, help_text, samples in extra:
+            lines += _family(name, kind, help_text, samples)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._pid = None
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM samples")
+        finally:
+            conn.close()
+
+    # runtime switches shared through the same database, e.g. the profiler settings
+
+    def get_setting(self, key, default=None):
+        # cached per process for settings_interval seconds
+        with self._lock:
+            self._local()
+            if time.monotonic() - self._settings_at >= self.settings_interval:
+                conn = self._connect()
+                try:
+                    self._settings = dict(conn.execute("SELECT key, value FROM settings").fetchall())
+                finally:
+                    conn.close()
+                self._settings_at = time.monotonic()
+            value = self._settings.get(key)
+        return json.loads(value) if value is not None else default
+
+    def set_setting(self, key, value):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, json.dumps(value)))
+        finally:
+            conn.close()
+        with self._lock:
+            self._settings_at = 0.0
+
+
+def _add(totals, key, value):
+    # adds a counter value or histogram into totals[key]
+    if not isinstance(value, dict):
+        totals[key] = totals.get(key, 0) + value
+        return
+    hist = totals.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+    hist["buckets"] = [a + b for a, b in zip(hist["buckets"], value["buckets"])]
+    hist["sum"] += value["sum"]
+    hist["count"] += value["count"]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _family(name, kind, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if kind != HISTOGRAM:
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        cumulative = 0
+        for bound, n in zip(BUCKETS, value["buckets"]):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {value['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(value['sum'])}")
+        lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return lines
+
+
+class SamplingProfiler:
+    # profiles a random share of requests to chosen endpoints; switched on and off at
+    # runtime through Metrics settings, so every worker follows within a few seconds
+    SETTING = "profile"
+
+    def __init__(self, metrics, directory):
+        self.metrics = metrics
+        self.directory = str(directory)
+        self._local = threading.local()
+        # serializes the read-merge-write of this process's stats files between request threads
+        self._merge_lock = threading.Lock()
+
+    def configure(self, rate, endpoints=()):
+        self.metrics.set_setting(self.SETTING, {"rate": rate, "endpoints": list(endpoints)})
+
+    def settings(self):
+        return self.metrics.get_setting(self.SETTING, {"rate": 0, "endpoints": []})
+
+    def start(self, endpoint):
+        conf = self.settings()
+        if not conf["rate"] or (conf["endpoints"] and endpoint not in conf["endpoints"]):
+            return
+        if random.random() >= conf["rate"]:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this process
+            return
+        self._local.current = (endpoint, profiler)
+
+    def stop(self):
+        current = getattr(self._local, "current", None)
+        if current is None:
+            return
+        self._local.current = None
+        endpoint, profiler = current
+        profiler.disable()
+        # one stats file per endpoint and process, merged when reported
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{endpoint}.{os.getpid()}.prof")
+        stats = pstats.Stats(profiler)
+        with self._merge_lock:
+            if os.path.exists(path):
+                try:
+                    stats.add(path)
+                except (OSError, EOFError, ValueError):
+                    pass
+            tmp = f"{path}.tmp"
+            stats.dump_stats(tmp)
+            os.replace(tmp, path)
+
+    def files(self, endpoint=None):
+        return sorted(glob.glob(os.path.join(self.directory, f"{endpoint or '*'}.*.prof")))
+
+    def report(self, stream, endpoint=None, sort="cumulative", limit=30):
+        files = self.files(endpoint)
+        if not files:
+            return False
+        stats = pstats.Stats(*files, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return True
+
+    def clear(self, endpoint=None):
+        for path in self.files(endpoint):
+            os.remove(path)
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional; pages are then served as gzip or identity only
+    brotli = None
+
+# A page whose content depends only on a version key (e.g. the question bank) and its
+# template file: rendered once per process, kept with gzip and brotli encodings, and
+# served with a strong ETag so repeat visits get a 304. A new version key or an edited
+# template re-renders on the next request.
+
+
+class Variant:
+    def __init__(self, body, encoding, etag):
+        self.body = body
+        self.encoding = encoding
+        self.etag = etag
+
+
+class RenderedPage:
+    def __init__(self, render, version, uptodate=None):
+        # render() -> str; version() -> key that changes with the page content;
+        # uptodate() -> False once the template changed on disk (Jinja's loader check)
+        self.render = render
+        self.version = version
+        self.uptodate = uptodate
+        self._lock = threading.Lock()
+        self._key = None
+        self._fresh = None
+        self.variants = {}
+
+    def _stale(self, key):
+        return not self.variants or key != self._key or (self._fresh is not None and not self._fresh())
+
+    def get(self, accept_encodings=None):
+        # the variant for the best encoding the client accepts ("br", "gzip", else identity);
+        # accept_encodings is the request's parsed Accept-Encoding, where q=0 means refused
+        key = self.version()
+        if self._stale(key):
+            with self._lock:
+                if self._stale(key):
+                    self._build(key)
+        variants = self.variants
+        if accept_encodings:
+            for encoding in ("br", "gzip"):
+                if encoding in variants and accept_encodings.quality(encoding) > 0:
+                    return variants[encoding]
+        return variants["identity"]
+
+    def _build(self, key):
+        body = self.render().encode("utf-8")
+        self._fresh = self.uptodate() if self.uptodate else None
+        tag = hashlib.sha1(body).hexdigest()[:20]
+        # strong ETags differ per encoding, since the bytes differ
+        variants = {"identity": Variant(body, None, tag),
+                    "gzip": Variant(gzip.compress(body, 9, mtime=0), "gzip", f"{tag}-gz")}
+        if brotli is not None:
+            variants["br"] = Variant(brotli.compress(body, quality=11), "br", f"{tag}-br")
+        self.variants = variants
+        self._key = key
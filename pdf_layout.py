@@ -0,0 +1,106 @@
+import re
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+
+# Text layout and pre-rendered layers for the report PDFs. Every paragraph and most lines
+# we draw come from fixed strings, so line breaks, word positions and the resulting PDF
+# operators are worked out once and pasted into each new document. The rest of reportlab
+# is imported on first use, so processes that never draw a PDF do not pay for it.
+
+_FONT_OP = re.compile(r"^BT (/F\d+)")
+
+
+def new_canvas(out, pagesize=A4):
+    from reportlab.pdfgen import canvas
+    return canvas.Canvas(out, pagesize=pagesize)
+
+
+@lru_cache(maxsize=4096)
+def layout_paragraph(text, fontname, fontsize, max_width):
+    # greedy line breaking, each word measured once; returns a tuple of lines, each a
+    # tuple of (x offset, text). Lines but the last are justified word by word.
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    space = stringWidth(" ", fontname, fontsize)
+    lines, line, line_width = [], [], 0.0
+    for w in text.split():
+        ww = stringWidth(w, fontname, fontsize)
+        if line and line_width + space + ww > max_width:
+            lines.append((line, line_width))
+            line, line_width = [], 0.0
+        line_width += (space if line else 0) + ww
+        line.append((w, ww))
+    if line:
+        lines.append((line, line_width))
+    laid_out = []
+    for idx, (words, _) in enumerate(lines):
+        if idx == len(lines) - 1:
+            laid_out.append(((0.0, " ".join(w for w, _ in words)),))
+            continue
+        gaps = len(words) - 1 if len(words) > 1 else 1
+        space_width = (max_width - sum(ww for _, ww in words)) / gaps
+        x, placed = 0.0, []
+        for w, ww in words:
+            placed.append((x, w))
+            x += ww + space_width
+        laid_out.append(tuple(placed))
+    return tuple(laid_out)
+
+
+# PDF operators for content that never changes, rendered once on a scratch canvas and
+# pasted into pages. `draw` works relative to the origin (or at absolute page positions
+# for layers pasted at 0, 0). Layers made at import time are rendered on first draw.
+class StaticLayer:
+    def __init__(self, draw, height=0, lazy=False):
+        self._draw = draw
+        self.ops = None
+        self.height = height
+        if not lazy:
+            self.render()
+
+    def render(self):
+        c = new_canvas(BytesIO())
+        self._draw(c)
+        internal = {v: k for k, v in c._doc.fontMapping.items()}
+        # internal font names (/F1, /F2...) depend on the order fonts appear in a
+        # document, so keep the font as a name and resolve it against the target
+        ops = []
+        for op in c._code:
+            m = _FONT_OP.match(op)
+            if m:
+                ops.append((internal[m.group(1)], op[m.end(1):]))
+            else:
+                ops.append((None, op))
+        self.ops = ops
+
+    def draw(self, c, x=0, y=0):
+        from reportlab.lib.rl_accel import fp_str
+        if self.ops is None:
+            self.render()
+        code = c._code
+        doc = c._doc
+        code.append(f"q 1 0 0 1 {fp_str(x)} {fp_str(y)} cm")
+        for font, op in self.ops:
+            code.append(op if font is None else f"BT {doc.getInternalFontName(font)}{op}")
+        code.append("Q")
+
+
+@lru_cache(maxsize=4096)
+def text_layer(text, fontname, fontsize):
+    def draw(c):
+        c.setFont(fontname, fontsize)
+        c.drawString(0, 0, text)
+    return StaticLayer(draw)
+
+
+@lru_cache(maxsize=1024)
+def paragraph_layer(text, max_width, leading, fontname, fontsize):
+    lines = layout_paragraph(text, fontname, fontsize, max_width)
+
+    def draw(c):
+        c.setFont(fontname, fontsize)
+        for i, line in enumerate(lines):
+            for dx, word in line:
+                c.drawString(dx, -i * leading, word)
+    return StaticLayer(draw, height=len(lines) * leading)
@@ -0,0 +1,72 @@
+import json
+from datetime import datetime
+
+from work_queue import WorkQueue
+
+# Background render queue: teacher PDF jobs, run by WorkQueue threads in every gunicorn
+# worker. A failed job keeps its error, and finished_at, for the dashboard.
+
+RUNNING, DONE, FAILED = "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after REAL NOT NULL,
+    locked_at REAL,
+    created_at TEXT NOT NULL,
+    finished_at TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_run_after ON jobs(status, run_after);
+"""
+
+
+class RenderQueue(WorkQueue):
+    table, schema = "jobs", SCHEMA
+    active, finished, failed = RUNNING, DONE, FAILED
+    thread_name = "render-worker"
+
+    def __init__(self, db_path, handlers, workers=2, max_pending=1000, **options):
+        self.handlers = handlers
+        super().__init__(db_path, workers=workers, max_pending=max_pending, **options)
+
+    def enqueue(self, kind, payload):
+        # returns the job id, or None when the queue is full so the caller can fall back
+        return self._insert({"kind": kind, "payload": json.dumps(payload)})
+
+    def run_one(self):
+        # claim and run a single job; returns False when nothing was ready
+        conn = self._connect()
+        try:
+            rows = self._claim(conn)
+            if not rows:
+                return False
+            job = rows[0]
+            try:
+                handler = self.handlers[job["kind"]]
+                result = handler(json.loads(job["payload"]))
+            except Exception as e:
+                self._fail(conn, job, f"{type(e).__name__}: {e}", finished_at=datetime.now().isoformat())
+            else:
+                self._succeed(conn, job, finished_at=datetime.now().isoformat(),
+                              result=None if result is None else str(result))
+            return True
+        finally:
+            conn.close()
+
+    def work(self):
+        return self.run_one()
+
+    def recent(self, limit=20):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT id, kind, status, attempts, created_at, finished_at, error FROM jobs "
+                                "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
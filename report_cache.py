@@ -0,0 +1,117 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from sqlite_db import connect
+
+# Size-bounded on-disk LRU cache of rendered teacher reports, shared by every worker.
+# Entries are keyed by (submission id, scoring version), so a change to the scoring
+# tables makes old renders miss and age out instead of being served.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    submission_id INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (submission_id, version)
+);
+CREATE INDEX IF NOT EXISTS reports_last_access ON reports(last_access);
+"""
+
+
+class ReportCache:
+    def __init__(self, directory, version, max_bytes=256 * 1024 * 1024, on_remove=None):
+        # on_remove(filenames) is told about every cached file that gets deleted
+        self.directory = Path(directory).resolve()
+        self.on_remove = on_remove
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(self.directory / "cache.db")
+        self.version = version
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def get(self, submission_id):
+        # path of the cached report for the current version, or None on a miss
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT filename FROM reports WHERE submission_id = ? AND version = ?",
+                               (submission_id, self.version)).fetchone()
+            if row is None:
+                return None
+            path = self.directory / row[0]
+            if not path.exists():
+                conn.execute("DELETE FROM reports WHERE submission_id = ? AND version = ?",
+                             (submission_id, self.version))
+                if self.on_remove:
+                    self.on_remove([row[0]])
+                return None
+            conn.execute("UPDATE reports SET last_access = ? WHERE submission_id = ? AND version = ?",
+                         (time.time(), submission_id, self.version))
+            return path
+        finally:
+            conn.close()
+
+    def put(self, submission_id, data):
+        filename = f"{submission_id}_{self.version}.pdf"
+        path = self.directory / filename
+        # a temp name of its own, so concurrent puts of one report (threads or processes) never collide
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = conn.execute("SELECT filename FROM reports WHERE submission_id = ? AND version != ?",
+                                 (submission_id, self.version)).fetchall()
+            conn.execute("DELETE FROM reports WHERE submission_id = ? AND version != ?", (submission_id, self.version))
+            conn.execute("INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?)",
+                         (submission_id, self.version, filename, len(data), time.time()))
+            stale += self._evict(conn, keep=submission_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        for (name,) in stale:
+            (self.directory / name).unlink(missing_ok=True)
+        if stale and self.on_remove:
+            self.on_remove([name for (name,) in stale])
+        return path
+
+    def _evict(self, conn, keep=None):
+        # drop least recently used entries until the cache fits again, never the one just written
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+        evicted = []
+        while total > self.max_bytes:
+            oldest = conn.execute("SELECT submission_id, version, filename, size FROM reports "
+                                  "WHERE submission_id IS NOT ? ORDER BY last_access LIMIT 64", (keep,)).fetchall()
+            if not oldest:
+                break
+            for submission_id, version, filename, size in oldest:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM reports WHERE submission_id = ? AND version = ?", (submission_id, version))
+                evicted.append((filename,))
+                total -= size
+        return evicted
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports").fetchone()
+            return {"count": count, "bytes": size, "max_bytes": self.max_bytes}
+        finally:
+            conn.close()
@@ -0,0 +1,169 @@
+import heapq
+import os
+import re
+import zlib
+from pathlib import Path
+
+from sqlite_db import connect
+
+# Catalog of the teacher report PDFs on disk, so the dashboard never globs or stats the
+# reports directory. Entries are spread over a few SQLite shards by filename, which keeps
+# concurrent writers from different workers apart; a dashboard page asks every shard for
+# its newest `limit` matches and merges them, so a page costs the same however many
+# reports there are. Search goes through an FTS5 index of the words in the name, roll
+# number and filename, so it costs what the matches cost rather than a scan.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    filename TEXT PRIMARY KEY,
+    submission_id INTEGER,
+    name TEXT NOT NULL,
+    rollno TEXT NOT NULL,
+    department TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_mtime ON reports(mtime, filename);
+CREATE INDEX IF NOT EXISTS reports_department_mtime ON reports(department, mtime, filename);
+"""
+
+# kept in step with `reports` by triggers; add_many() upserts so a re-added file updates in place
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_search USING fts5(
+    name, rollno, filename, content='reports', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS reports_search_insert AFTER INSERT ON reports BEGIN
+    INSERT INTO reports_search (rowid, name, rollno, filename) VALUES (new.rowid, new.name, new.rollno, new.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS reports_search_delete AFTER DELETE ON reports BEGIN
+    INSERT INTO reports_search (reports_search, rowid, name, rollno, filename)
+    VALUES ('delete', old.rowid, old.name, old.rollno, old.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS reports_search_update AFTER UPDATE ON reports BEGIN
+    INSERT INTO reports_search (reports_search, rowid, name, rollno, filename)
+    VALUES ('delete', old.rowid, old.name, old.rollno, old.filename);
+    INSERT INTO reports_search (rowid, name, rollno, filename) VALUES (new.rowid, new.name, new.rollno, new.filename);
+END;
+"""
+
+COLUMNS = ("filename", "submission_id", "name", "rollno", "department", "size", "mtime")
+
+
+class ReportCatalog:
+    def __init__(self, directory, shards=8):
+        self.directory = Path(directory).resolve()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shards = shards
+        self.paths = [str(self.directory / f"shard_{n:02d}.db") for n in range(shards)]
+        # True when the catalog did not exist yet, i.e. it needs a reconcile() to fill it
+        self.created = not all(os.path.exists(p) for p in self.paths)
+        for path in self.paths:
+            with self._connect(path) as conn:
+                conn.executescript(SCHEMA)
+                indexed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'reports_search'").fetchone()
+                conn.executescript(SEARCH_SCHEMA)
+                if not indexed:
+                    # shard written before the search index existed
+                    conn.execute("INSERT INTO reports_search (reports_search) VALUES ('rebuild')")
+
+    def _connect(self, path):
+        return connect(path, rows=True)
+
+    def _shard(self, filename):
+        return self.paths[zlib.crc32(filename.encode("utf-8")) % self.shards]
+
+    def _by_shard(self, entries, key):
+        groups = {}
+        for entry in entries:
+            groups.setdefault(self._shard(key(entry)), []).append(entry)
+        return groups.items()
+
+    def add_many(self, entries):
+        # entries: dicts with the COLUMNS keys; filename is relative to the reports directory
+        for path, group in self._by_shard(entries, lambda e: e["filename"]):
+            conn = self._connect(path)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(f"INSERT INTO reports VALUES ({', '.join('?' * len(COLUMNS))}) ON CONFLICT (filename) "
+                                 f"DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}",
+                                 ([e.get(c, "") if c != "submission_id" else e.get(c) for c in COLUMNS]
+                                  for e in group))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+    def add(self, filename, size, mtime, submission_id=None, name="", rollno="", department=""):
+        self.add_many([{"filename": filename, "submission_id": submission_id, "name": name, "rollno": rollno,
+                        "department": department, "size": size, "mtime": mtime}])
+
+    def remove(self, filenames):
+        for path, group in self._by_shard(filenames, lambda f: f):
+            conn = self._connect(path)
+            try:
+                conn.executemany("DELETE FROM reports WHERE filename = ?", ((f,) for f in group))
+            finally:
+                conn.close()
+
+    def page(self, limit=50, before=None, department="", search=""):
+        # newest first; before: the cursor() of the last entry on the previous page
+        where, params = [], []
+        if before:
+            mtime, _, filename = before.partition(":")
+            where.append("(mtime, filename) < (?, ?)")
+            params += [float(mtime), filename]
+        if department:
+            where.append("department = ?")
+            params.append(department)
+        query = search_query(search)
+        if query:
+            where.append("rowid IN (SELECT rowid FROM reports_search WHERE reports_search MATCH ?)")
+            params.append(query)
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM reports {'WHERE ' + ' AND '.join(where) if where else ''} "
+               "ORDER BY mtime DESC, filename DESC LIMIT ?")
+        per_shard = []
+        for path in self.paths:
+            conn = self._connect(path)
+            try:
+                per_shard.append([dict(r) for r in conn.execute(sql, params + [limit])])
+            finally:
+                conn.close()
+        merged = heapq.merge(*per_shard, key=lambda e: (e["mtime"], e["filename"]), reverse=True)
+        return [e for _, e in zip(range(limit), merged)]
+
+    @staticmethod
+    def cursor(entry):
+        return f"{entry['mtime']!r}:{entry['filename']}"
+
+    def count(self):
+        total = 0
+        for path in self.paths:
+            conn = self._connect(path)
+            try:
+                total += conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+            finally:
+                conn.close()
+        return total
+
+    def reconcile(self, entries, batch=5000):
+        # replace the whole catalog with `entries` (e.g. from a directory scan); returns the count
+        for path in self.paths:
+            conn = self._connect(path)
+            try:
+                conn.execute("DELETE FROM reports")
+            finally:
+                conn.close()
+        n, chunk = 0, []
+        for entry in entries:
+            chunk.append(entry)
+            if len(chunk) >= batch:
+                self.add_many(chunk)
+                n += len(chunk)
+                chunk = []
+        self.add_many(chunk)
+        return n + len(chunk)
+
+
+def search_query(search):
+    # every word of the search must start a word of the name, roll number or filename
+    words = re.findall(r"\w+", search)
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
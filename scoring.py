@@ -0,0 +1,126 @@
+import numpy as np
+
+from answer_codec import QUESTION_COUNT, options_for, unpack_codes_many
+
+# Vectorized scoring: the answer key, section layout and level bands are compiled into
+# NumPy lookup tables once, then a whole N x 50 matrix of answer codes is scored in a
+# single pass. compute_scores() in app.py goes through the same tables for one row.
+
+MISSING = 5  # answer code for a missing or unrecognised answer; scores 0
+
+
+class BatchScores:
+    def __init__(self, engine, per_question, section_totals, total, percentage, overall_level, section_level):
+        self.engine = engine
+        self.per_question = per_question      # N x 50 item scores
+        self.section_totals = section_totals  # N x sections
+        self.total = total                    # N
+        self.percentage = percentage          # N, rounded to 2 places
+        self.overall_level = overall_level    # N indices into engine.overall_levels
+        self.section_level = section_level    # N x sections indices into engine.section_levels[s]
+
+    def __len__(self):
+        return len(self.total)
+
+    def overall_level_names(self):
+        return np.asarray(self.engine.overall_levels, dtype=object)[self.overall_level]
+
+    def section_level_names(self):
+        names = np.empty(self.section_level.shape, dtype=object)
+        for s, levels in enumerate(self.engine.section_levels):
+            names[:, s] = np.asarray(levels, dtype=object)[self.section_level[:, s]]
+        return names
+
+
+class ScoringEngine:
+    def __init__(self, sjt_key, section_map, section_max, section_level_fn, overall_level_fn):
+        self.sections = list(section_map)
+        self.section_level_fn = section_level_fn
+        self.overall_level_fn = overall_level_fn
+        self.section_max = np.array([section_max[sec] for sec in self.sections])
+        self.max_total = int(self.section_max.sum())
+
+        # score_table[q-1, code]: Likert options score their own value, SJT options by key
+        self.score_table = np.zeros((QUESTION_COUNT, MISSING + 1), dtype=np.int16)
+        self.codes = []
+        for q in range(1, QUESTION_COUNT + 1):
+            opts = options_for(q)
+            self.codes.append({opt: i for i, opt in enumerate(opts)})
+            for i, opt in enumerate(opts):
+                self.score_table[q - 1, i] = sjt_key[q].get(opt, 0) if q in sjt_key else int(opt)
+
+        # membership[q-1, s] = 1 when question q belongs to section s
+        self.membership = np.zeros((QUESTION_COUNT, len(self.sections)), dtype=np.int16)
+        for s, sec in enumerate(self.sections):
+            for q in section_map[sec]:
+                self.membership[q - 1, s] = 1
+
+        # level bands, evaluated once for every reachable score
+        best = self.score_table.max(axis=1)
+        reachable = [int(best[self.membership[:, s] == 1].sum()) for s in range(len(self.sections))]
+        self.section_levels = []
+        self.section_level_table = []
+        for s, sec in enumerate(self.sections):
+            names, table = [], []
+            for score in range(reachable[s] + 1):
+                lvl = section_level_fn(sec, score)[0]
+                if lvl not in names:
+                    names.append(lvl)
+                table.append(names.index(lvl))
+            self.section_levels.append(names)
+            self.section_level_table.append(np.array(table))
+        self.overall_levels = []
+        table = []
+        for total in range(int(best.sum()) + 1):
+            lvl = overall_level_fn(self.percentage_of(total))[0]
+            if lvl not in self.overall_levels:
+                self.overall_levels.append(lvl)
+            table.append(self.overall_levels.index(lvl))
+        self.overall_level_table = np.array(table)
+        # looked up rather than computed so it rounds exactly like percentage_of()
+        self.percentage_table = np.array([self.percentage_of(t) for t in range(int(best.sum()) + 1)], dtype=float)
+
+    def percentage_of(self, total):
+        return round((total / self.max_total) * 100, 2) if self.max_total else 0
+
+    def section_level_name(self, s, score):
+        # level of a stored section score; scores outside the table (legacy CSV imports) use the bands directly
+        table = self.section_level_table[s]
+        if 0 <= score < len(table):
+            return self.section_levels[s][table[score]]
+        return self.section_level_fn(self.sections[s], score)[0]
+
+    def overall_level_name(self, total):
+        if 0 <= total < len(self.overall_level_table):
+            return self.overall_levels[self.overall_level_table[total]]
+        return self.overall_level_fn(self.percentage_of(total))[0]
+
+    def encode(self, answers):
+        # one {"1": "5", ..., "50": "C"} dict -> row of answer codes
+        return [self.codes[q].get(answers.get(str(q + 1)), MISSING) for q in range(QUESTION_COUNT)]
+
+    def encode_many(self, answer_dicts):
+        return np.array([self.encode(a) for a in answer_dicts], dtype=np.uint8).reshape(-1, QUESTION_COUNT)
+
+    def encode_packed(self, blobs):
+        # packed answers decode straight to answer codes (option indices)
+        return unpack_codes_many(list(blobs))
+
+    def score(self, codes):
+        codes = np.asarray(codes, dtype=np.intp).reshape(-1, QUESTION_COUNT)
+        per_question = self.score_table[np.arange(QUESTION_COUNT), codes]
+        section_totals = per_question @ self.membership
+        total = section_totals.sum(axis=1)
+        percentage = self.percentage_table[total]
+        overall_level = self.overall_level_table[total]
+        section_level = np.empty_like(section_totals)
+        for s, table in enumerate(self.section_level_table):
+            section_level[:, s] = table[section_totals[:, s]]
+        return BatchScores(self, per_question, section_totals, total, percentage, overall_level, section_level)
+
+    def score_one(self, answers):
+        # same return shape as compute_scores(): (section_scores, total, max_total, per_q)
+        result = self.score([self.encode(answers)])
+        section_scores = {sec: int(v) for sec, v in zip(self.sections, result.section_totals[0])}
+        per_q = {q + 1: int(v) for q, v in enumerate(result.per_question[0])}
+        return section_scores, int(result.total[0]), self.max_total, per_q
@@ -0,0 +1,15 @@
+import sqlite3
+
+# How every SQLite file of the app is opened: WAL, so readers never block the writer and
+# all gunicorn workers can share one file; synchronous=NORMAL, which is crash-safe under
+# WAL; a 30s busy timeout; and autocommit, so writers open their own BEGIN IMMEDIATE.
+
+
+def connect(path, rows=False):
+    # rows: return sqlite3.Row instead of tuples
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if rows:
+        conn.row_factory = sqlite3.Row
+    return conn
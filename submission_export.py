@@ -0,0 +1,128 @@
+import csv
+import json
+from io import StringIO
+
+from bulk_export import ChunkSink
+
+# Streaming submissions export. Rows come out of the store in id order, in batches, and
+# are encoded a buffer (CSV/JSONL) or a row group (Parquet) at a time, so memory stays flat
+# however many rows match. For a fixed query and snapshot (highest id) the bytes are
+# identical on every run, which is what lets an interrupted download resume by range.
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+INTEGER_COLUMNS = {"id", "total"}
+FLOAT_COLUMNS = {"percentage"}
+
+
+def available_columns(store):
+    return ["id"] + store.header
+
+
+def parse_columns(store, spec):
+    # "name,rollno,total" -> column list in the requested order; raises ValueError on unknown names
+    available = available_columns(store)
+    if not spec:
+        return store.header
+    columns = [c.strip() for c in spec.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown or not columns:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}" if unknown else "No columns selected")
+    return columns
+
+
+def _values(rec, columns):
+    return [rec[c] if c in rec else rec["section_scores"].get(c, 0) for c in columns]
+
+
+def stream_csv(records, columns, flush_at=64 * 1024):
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for rec in records:
+        writer.writerow(_values(rec, columns))
+        if buf.tell() > flush_at:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+def stream_jsonl(records, columns, flush_at=64 * 1024):
+    lines, size = [], 0
+    for rec in records:
+        line = json.dumps(dict(zip(columns, _values(rec, columns))), ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size > flush_at:
+            yield "".join(lines).encode("utf-8")
+            lines, size = [], 0
+    yield "".join(lines).encode("utf-8")
+
+
+def _pyarrow():
+    # optional and slow to import; only the Parquet format needs it
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def parquet_schema(store, columns):
+    pa = _pyarrow()
+    sections = set(store.sections)
+    return pa.schema([(c, pa.int64() if c in INTEGER_COLUMNS or c in sections
+                       else pa.float64() if c in FLOAT_COLUMNS else pa.string()) for c in columns])
+
+
+def stream_parquet(records, columns, schema, row_group=10000):
+    # one row group per `row_group` rows, written to a sink drained after each group
+    pa = _pyarrow()
+    sink = ChunkSink()
+    writer = pa.parquet.ParquetWriter(sink, schema, compression="snappy")
+    rows = []
+
+    def write_group():
+        data = {c: [] for c in columns}
+        for values in rows:
+            for c, v in zip(columns, values):
+                data[c].append(v)
+        writer.write_table(pa.table(data, schema=schema))
+        rows.clear()
+
+    for rec in records:
+        rows.append(_values(rec, columns))
+        if len(rows) >= row_group:
+            write_group()
+            yield sink.drain()
+    if rows:
+        write_group()
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(store, fmt, columns, filters):
+    # generator of byte chunks; raises ValueError if the format cannot be produced here
+    records = store.iter_all(batch=5000, **filters)
+    if fmt == "csv":
+        return stream_csv(records, columns)
+    if fmt == "jsonl":
+        return stream_jsonl(records, columns)
+    if fmt == "parquet":
+        if _pyarrow() is None:
+            raise ValueError("Parquet export needs the pyarrow package")
+        return stream_parquet(records, columns, parquet_schema(store, columns))
+    raise ValueError(f"Unknown export format: {fmt}")
+
+
+def byte_range(chunks, start, stop):
+    # the [start, stop) slice of a chunk stream, without holding more than one chunk
+    pos = 0
+    for chunk in chunks:
+        end = pos + len(chunk)
+        if end > start and pos < stop:
+            yield chunk[max(0, start - pos):min(len(chunk), stop - pos)]
+        pos = end
+        if pos >= stop:
+            return
@@ -0,0 +1,295 @@
+import csv
+import json
+
+from sqlite_db import connect
+
+# Submission store: one SQLite table in WAL mode so every gunicorn worker can insert
+# concurrently, with indexes that keep newest-first dashboard pages cheap at any size.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    name TEXT NOT NULL,
+    rollno TEXT NOT NULL,
+    department TEXT NOT NULL,
+    class_section TEXT NOT NULL,
+    email TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    sections TEXT NOT NULL,
+    answers BLOB,
+    ingest_key TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_timestamp ON submissions(timestamp);
+CREATE INDEX IF NOT EXISTS submissions_rollno ON submissions(rollno, timestamp);
+CREATE INDEX IF NOT EXISTS submissions_department ON submissions(department, timestamp);
+CREATE INDEX IF NOT EXISTS submissions_class_section ON submissions(class_section, timestamp);
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    pending_from INTEGER,
+    pending_to INTEGER
+);
+"""
+
+# created once the columns they cover exist. Submissions and legacy CSV rows are told
+# apart by time and roll number; ingested rows by their place in the source file, which
+# may have no timestamps or no roll numbers.
+KEYS = """
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_timestamp_rollno ON submissions(timestamp, rollno)
+    WHERE ingest_key IS NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS submissions_ingest_key ON submissions(ingest_key) WHERE ingest_key IS NOT NULL;
+"""
+
+CSV_HEADER = ["timestamp", "name", "rollno", "department", "classSection", "email", "total", "percentage"]
+
+# dashboard/API filter name -> column
+FILTERS = {"rollno": "rollno", "department": "department", "classSection": "class_section"}
+
+
+class SubmissionStore:
+    def __init__(self, db_path, sections):
+        self.db_path = str(db_path)
+        self.sections = list(sections)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # databases created before raw answers were kept
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(submissions)")}
+            if "answers" not in columns:
+                conn.execute("ALTER TABLE submissions ADD COLUMN answers BLOB")
+            if "ingest_key" not in columns:
+                conn.execute("ALTER TABLE submissions ADD COLUMN ingest_key TEXT")
+            # the (timestamp, rollno) key used to cover ingested rows too
+            old = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'submissions_timestamp_rollno'").fetchone()
+            if old and "WHERE" not in old["sql"]:
+                conn.execute("DROP INDEX submissions_timestamp_rollno")
+            conn.executescript(KEYS)
+
+    def _connect(self):
+        return connect(self.db_path, rows=True)
+
+    @property
+    def header(self):
+        return CSV_HEADER + self.sections
+
+    def _values(self, timestamp, student_info, total, percentage, section_scores):
+        return (timestamp, student_info.get("name", ""), student_info.get("rollno", ""),
+                student_info.get("department", ""), student_info.get("classSection", ""),
+                student_info.get("email", ""), total, percentage,
+                json.dumps([section_scores.get(sec, 0) for sec in self.sections]))
+
+    def add(self, timestamp, student_info, total, percentage, section_scores, answers=None):
+        # answers: packed raw answers (see answer_codec); returns the new submission id
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "INSERT INTO submissions (timestamp, name, rollno, department, class_section, email, total, "
+                "percentage, sections, answers) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._values(timestamp, student_info, total, percentage, section_scores) + (answers,))
+            return cur.lastrowid
+        finally:
+            conn.close()
+
+    def add_many(self, rows, checkpoint=None):
+        # rows: (timestamp, student_info, total, percentage, section_scores, answers, ingest_key),
+        # in one transaction; ingest_key names the row's source file and position in it.
+        # checkpoint: (source, position) saved in that same transaction, with the new ids
+        # marked pending until clear_pending(). Returns the new ids, None for rows skipped as
+        # already present (same ingest_key).
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = []
+            for timestamp, student_info, total, percentage, section_scores, answers, ingest_key in rows:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO submissions (timestamp, name, rollno, department, class_section, email, "
+                    "total, percentage, sections, answers, ingest_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._values(timestamp, student_info, total, percentage, section_scores) + (answers, ingest_key))
+                ids.append(cur.lastrowid if cur.rowcount else None)
+            if checkpoint is not None:
+                new = [i for i in ids if i is not None]
+                conn.execute("INSERT OR REPLACE INTO ingest_checkpoints VALUES (?, ?, ?, ?)",
+                             checkpoint + ((new[0], new[-1]) if new else (None, None)))
+            conn.execute("COMMIT")
+            return ids
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def checkpoint(self, source):
+        # (rows consumed, first pending id, last pending id) for an ingest source
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT position, pending_from, pending_to FROM ingest_checkpoints WHERE source = ?",
+                               (source,)).fetchone()
+            return tuple(row) if row else (0, None, None)
+        finally:
+            conn.close()
+
+    def clear_pending(self, source):
+        conn = self._connect()
+        try:
+            conn.execute("UPDATE ingest_checkpoints SET pending_from = NULL, pending_to = NULL WHERE source = ?",
+                         (source,))
+        finally:
+            conn.close()
+
+    def reset_checkpoint(self, source):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM ingest_checkpoints WHERE source = ?", (source,))
+        finally:
+            conn.close()
+
+    def _record(self, row):
+        rec = {"id": row["id"], "timestamp": row["timestamp"], "name": row["name"], "rollno": row["rollno"],
+               "department": row["department"], "classSection": row["class_section"], "email": row["email"],
+               "total": row["total"], "percentage": row["percentage"]}
+        rec["section_scores"] = dict(zip(self.sections, json.loads(row["sections"])))
+        rec["answers"] = row["answers"]
+        return rec
+
+    def as_row(self, rec):
+        # same column order as the legacy submissions.csv
+        return [rec[h] for h in CSV_HEADER] + [rec["section_scores"].get(sec, 0) for sec in self.sections]
+
+    def _where(self, filters, before=None):
+        clauses, params = [], []
+        for key, col in FILTERS.items():
+            if filters.get(key):
+                clauses.append(f"{col} = ?")
+                params.append(filters[key])
+        # date range on the ISO timestamp: since inclusive, until exclusive
+        if filters.get("since"):
+            clauses.append("timestamp >= ?")
+            params.append(filters["since"])
+        if filters.get("until"):
+            clauses.append("timestamp < ?")
+            params.append(filters["until"])
+        # snapshot bound: ignore submissions added after an export started
+        if filters.get("upto") is not None:
+            clauses.append("id <= ?")
+            params.append(filters["upto"])
+        if before is not None:
+            # rowid rides along in every index, so (timestamp, id) is a valid keyset cursor
+            clauses.append("(timestamp, id) < (SELECT timestamp, id FROM submissions WHERE id = ?)")
+            params.append(before)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def page(self, limit=50, before=None, **filters):
+        # keyset pagination: newest first, continue with before=<last id of previous page>
+        where, params = self._where(filters, before)
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"SELECT * FROM submissions{where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+                                params + [limit]).fetchall()
+            return [self._record(r) for r in rows]
+        finally:
+            conn.close()
+
+    def max_id(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM submissions").fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_range(self, first, last):
+        # submissions with first <= id <= last, in id order
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM submissions WHERE id BETWEEN ? AND ? ORDER BY id", (first, last)).fetchall()
+            return [self._record(r) for r in rows]
+        finally:
+            conn.close()
+
+    def get(self, submission_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM submissions WHERE id = ?", (submission_id,)).fetchone()
+            return self._record(row) if row else None
+        finally:
+            conn.close()
+
+    def iter_all(self, batch=1000, **filters):
+        # oldest first, in bounded batches
+        where, params = self._where(filters)
+        last = 0
+        conn = self._connect()
+        try:
+            while True:
+                extra = " AND id > ?" if where else " WHERE id > ?"
+                rows = conn.execute(f"SELECT * FROM submissions{where}{extra} ORDER BY id LIMIT ?",
+                                    params + [last, batch]).fetchall()
+                if not rows:
+                    return
+                for r in rows:
+                    yield self._record(r)
+                last = rows[-1]["id"]
+        finally:
+            conn.close()
+
+    def answer_batches(self, after=0, batch=10000):
+        # (ids, packed answers) for submissions with stored answers and id > after, in id order
+        conn = self._connect()
+        try:
+            while True:
+                rows = conn.execute("SELECT id, answers FROM submissions WHERE id > ? AND answers IS NOT NULL "
+                                    "ORDER BY id LIMIT ?", (after, batch)).fetchall()
+                if not rows:
+                    return
+                yield [r["id"] for r in rows], [r["answers"] for r in rows]
+                after = rows[-1]["id"]
+        finally:
+            conn.close()
+
+    def update_scores(self, rows):
+        # rows: (submission id, total, percentage, [section scores in store order]) after re-scoring
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE submissions SET total = ?, percentage = ?, sections = ? WHERE id = ?",
+                             [(total, pct, json.dumps(sections), sid) for sid, total, pct, sections in rows])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def import_csv(self, csv_path, batch=1000):
+        # one-shot import of a legacy submissions.csv; rows already present are skipped
+        inserted = 0
+        conn = self._connect()
+        try:
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                header = next(reader, None) or []
+                idx = {h: i for i, h in enumerate(header)}
+                pending = []
+                for row in reader:
+                    if not row:
+                        continue
+                    get = lambda h, default="": row[idx[h]] if h in idx and idx[h] < len(row) else default
+                    student_info = {"name": get("name"), "rollno": get("rollno"), "department": get("department"),
+                                    "classSection": get("classSection"), "email": get("email")}
+                    section_scores = {sec: int(float(get(sec, 0) or 0)) for sec in self.sections}
+                    pending.append(self._values(get("timestamp"), student_info, int(float(get("total", 0) or 0)),
+                                                float(get("percentage", 0) or 0), section_scores))
+                    if len(pending) >= batch:
+                        inserted += self._insert_many(conn, pending)
+                        pending = []
+                if pending:
+                    inserted += self._insert_many(conn, pending)
+        finally:
+            conn.close()
+        return inserted
+
+    def _insert_many(self, conn, values):
+        before = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT OR IGNORE INTO submissions (timestamp, name, rollno, department, class_section, email, total, "
+            "percentage, sections) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+        conn.execute("COMMIT")
+        return conn.total_changes - before
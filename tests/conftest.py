@@ -0,0 +1,22 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    # app.py keeps its databases and report directories in the working directory, by
+    # relative path, so the tests stay in a scratch one while it is in use
+    workdir = tmp_path_factory.mktemp("app")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        yield importlib.import_module("app")
+    finally:
+        os.chdir(cwd)
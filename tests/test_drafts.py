@@ -0,0 +1,59 @@
+from answer_codec import QUESTION_COUNT, options_for
+from draft_store import DraftStore
+
+
+def full_form():
+    form = {f"q{q}": options_for(q)[0] for q in range(1, QUESTION_COUNT + 1)}
+    form.update(studentName="Test Student", rollNumber="T1", department="CSE", classSection="A")
+    return form
+
+
+def test_full_store_refuses_new_drafts_without_evicting(tmp_path):
+    store = DraftStore(tmp_path / "drafts.db", max_drafts=2)
+    first, second = store.create(), store.create()
+    store.update(first, {"q1": "3"})
+    assert store.create() is None
+    assert store.get(first) == {"q1": "3"}
+    assert store.get(second) == {}
+
+
+def test_expired_drafts_make_room(tmp_path):
+    store = DraftStore(tmp_path / "drafts.db", ttl=-1, max_drafts=1)
+    assert store.create() is not None
+    assert store.create() is not None
+    assert store.stats()["count"] == 1
+
+
+def test_submit_with_expired_draft_uses_the_posted_form(app_module):
+    client = app_module.app.test_client()
+    resp = client.post("/submit", data={"draftToken": "expired", **full_form()})
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/pdf"
+
+
+def test_submit_with_expired_draft_and_missing_answers_is_gone(app_module):
+    client = app_module.app.test_client()
+    form = full_form()
+    del form["q7"]
+    assert client.post("/submit", data={"draftToken": "expired", **form}).status_code == 410
+    assert client.post("/submit", data=form).status_code == 400
+
+
+def test_submit_finishes_from_a_draft(app_module):
+    client = app_module.app.test_client()
+    token = client.post("/draft").get_json()["token"]
+    form = full_form()
+    name = form.pop("studentName")
+    assert client.patch(f"/draft/{token}", json={"fields": form}).get_json()["missing"] == 0
+    resp = client.post("/submit", data={"draftToken": token, "studentName": name})
+    assert resp.status_code == 200
+    assert client.get(f"/draft/{token}").status_code == 404
+
+
+def test_patch_with_a_body_that_is_not_an_object_is_rejected(app_module):
+    client = app_module.app.test_client()
+    token = client.post("/draft").get_json()["token"]
+    for body in ('"x"', "[1]", "5", "null", "{not json"):
+        resp = client.patch(f"/draft/{token}", data=body, content_type="application/json")
+        assert resp.status_code == 400
+        assert resp.get_json()["error"] == "Expected an object of form fields."
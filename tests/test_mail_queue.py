@@ -0,0 +1,86 @@
+import socket
+
+import pytest
+
+from mail_queue import DEAD, SENT, MailQueue, SMTPPool
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class Recorder:
+    # accepts every recipient except bad@ (550) and later@ (451), and keeps what it received
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bad@"):
+            return "550 no such user"
+        if address.startswith("later@"):
+            return "451 try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos[0], envelope.content))
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    handler = Recorder()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def drain(queue):
+    while queue.send_batch():
+        pass
+
+
+def test_batch_is_sent_over_one_connection(tmp_path, smtp_server):
+    handler, port = smtp_server
+    pool = SMTPPool("127.0.0.1", port)
+    queue = MailQueue(tmp_path / "mail.db", pool, "reports@example.org", workers=0, batch_size=10)
+    for n in range(6):
+        queue.enqueue(f"student{n}@example.org", "Your report", "Attached.", (f"report{n}.pdf", b"%PDF-1.4"))
+    drain(queue)
+    pool.close()
+    assert pool.connects == 1
+    assert sorted(to for to, _ in handler.messages) == [f"student{n}@example.org" for n in range(6)]
+    assert b"report3.pdf" in dict(handler.messages)["student3@example.org"]
+    assert queue.stats()[SENT] == 6
+
+
+def test_rejections_become_dead_letters_and_can_be_retried(tmp_path, smtp_server):
+    handler, port = smtp_server
+    queue = MailQueue(tmp_path / "mail.db", SMTPPool("127.0.0.1", port), "reports@example.org", workers=0,
+                      max_attempts=2, retry_delay=0)
+    for recipient in ["ok@example.org", "bad@example.org", "later@example.org"]:
+        queue.enqueue(recipient, "Your report", "Attached.")
+    drain(queue)
+    stats = queue.stats()
+    assert (stats[SENT], stats[DEAD]) == (1, 2)
+    # 550 gives up at once, 451 only once out of attempts
+    attempts = {m["recipient"]: m["attempts"] for m in queue.dead_letters()}
+    assert attempts == {"bad@example.org": 1, "later@example.org": 2}
+    assert queue.retry_dead() == 2
+    assert queue.stats()[DEAD] == 0
+
+
+def test_prune_keeps_the_totals(tmp_path, smtp_server):
+    handler, port = smtp_server
+    queue = MailQueue(tmp_path / "mail.db", SMTPPool("127.0.0.1", port), "reports@example.org", workers=0,
+                      keep_finished=3)
+    for n in range(8):
+        queue.enqueue(f"student{n}@example.org", "Your report", "Attached.")
+    drain(queue)
+    assert queue.prune() == 5
+    assert queue.prune() == 0
+    assert queue.stats()[SENT] == 8
+    with queue._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 3
@@ -0,0 +1,38 @@
+import multiprocessing
+
+from metrics import RETIRED, Metrics
+
+
+def count_in_child(metrics, n):
+    # exits well before flush_interval, so only the exit flush saves the count
+    metrics.inc("jobs_total", n)
+    metrics.observe("job_seconds", 0.02)
+
+
+def run_child(metrics, n):
+    child = multiprocessing.get_context("fork").Process(target=count_in_child, args=(metrics, n))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+
+def processes(metrics):
+    with metrics._connect() as conn:
+        return {p for (p,) in conn.execute("SELECT DISTINCT process FROM samples")}
+
+
+def test_exited_processes_are_folded_into_retired_rows(tmp_path):
+    metrics = Metrics(tmp_path / "metrics.db", flush_interval=60)
+    metrics.inc("jobs_total", 1)
+    run_child(metrics, 10)
+    totals = metrics.collect()
+    assert totals[("jobs_total", "[]")] == 11
+    assert totals[("job_seconds", "[]")]["count"] == 1
+    assert processes(metrics) == {RETIRED, metrics._process}
+
+    run_child(metrics, 100)
+    run_child(metrics, 1000)
+    assert metrics.collect()[("jobs_total", "[]")] == 1111
+    assert processes(metrics) == {RETIRED, metrics._process}
+    with metrics._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM samples WHERE process = ?", (RETIRED,)).fetchone()[0] == 2
@@ -0,0 +1,30 @@
+import pytest
+from werkzeug.http import parse_accept_header
+
+from page_cache import RenderedPage
+
+
+def page():
+    return RenderedPage(lambda: "<p>test page</p>" * 50, lambda: 1)
+
+
+def encoding_for(header):
+    return page().get(parse_accept_header(header)).encoding
+
+
+def test_preferred_encodings():
+    assert encoding_for("gzip, deflate") == "gzip"
+    assert encoding_for("") is None
+    assert page().get().encoding is None
+
+
+def test_refused_encodings_are_not_served():
+    assert encoding_for("gzip;q=0, br;q=0") is None
+    assert encoding_for("gzip, br;q=0") == "gzip"
+    assert encoding_for("*;q=0") is None
+
+
+def test_brotli_is_preferred_when_accepted():
+    pytest.importorskip("brotli")
+    assert encoding_for("gzip, br") == "br"
+    assert encoding_for("gzip;q=0, br") == "br"
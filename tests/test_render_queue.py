@@ -0,0 +1,57 @@
+import time
+
+from render_queue import DONE, RUNNING, RenderQueue
+
+
+class Unprintable:
+    def __str__(self):
+        raise ValueError("cannot be stored")
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_a_job_that_breaks_the_worker_does_not_stop_later_jobs(tmp_path):
+    # the handler succeeds but its result cannot be stored, so run_one itself raises
+    handlers = {"bad": lambda payload: Unprintable(), "ok": lambda payload: payload["n"]}
+    queue = RenderQueue(tmp_path / "jobs.db", handlers, workers=1, poll_interval=0.05)
+    queue.enqueue("bad", {})
+    later = [queue.enqueue("ok", {"n": n}) for n in range(3)]
+    assert wait_for(lambda: queue.stats()[DONE] == len(later))
+    assert all(thread.is_alive() for thread in queue._threads)
+    jobs = {job["id"]: job["status"] for job in queue.recent()}
+    assert [jobs[job_id] for job_id in later] == [DONE] * len(later)
+    # the broken job stays leased until its lease runs out
+    assert queue.stats()[RUNNING] == 1
+
+
+def test_an_idle_poll_does_not_take_the_write_lock(tmp_path):
+    queue = RenderQueue(tmp_path / "jobs.db", {}, workers=0)
+    writer = queue._connect()
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.monotonic()
+        assert queue.run_one() is False
+        assert time.monotonic() - started < 1
+    finally:
+        writer.execute("ROLLBACK")
+        writer.close()
+
+
+def test_resume_starts_threads_only_for_leftover_jobs(tmp_path):
+    handlers = {"ok": lambda payload: payload["n"]}
+    idle = RenderQueue(tmp_path / "idle.db", handlers)
+    idle.resume()
+    assert idle._threads == []
+    leftover = RenderQueue(tmp_path / "leftover.db", handlers, workers=0)
+    leftover.enqueue("ok", {"n": 1})
+    restarted = RenderQueue(tmp_path / "leftover.db", handlers, workers=1, poll_interval=0.05)
+    restarted.resume()
+    assert len(restarted._threads) == 1
+    assert wait_for(lambda: restarted.stats()[DONE] == 1)
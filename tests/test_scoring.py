@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from answer_codec import QUESTION_COUNT, options_for, pack_answers, unpack_answers, unpack_codes_many
+
+
+def random_answers(rng):
+    return {str(q): rng.choice(options_for(q)) for q in range(1, QUESTION_COUNT + 1)}
+
+
+def baseline_compute_scores(app_module, answers):
+    # compute_scores() as it was before the scoring engine, kept as the reference
+    per_q = {}
+    for i in range(1, 41):
+        v = answers.get(str(i))
+        per_q[i] = int(v) if v and v.isdigit() else 0
+    for i in range(41, 51):
+        v = answers.get(str(i))
+        per_q[i] = app_module.SJT_KEY.get(i, {}).get(v, 0)
+    section_scores = {sec: sum(per_q[q] for q in rng) for sec, rng in app_module.SECTION_MAP.items()}
+    return section_scores, sum(section_scores.values()), sum(app_module.SECTION_MAX.values()), per_q
+
+
+def test_pack_unpack_round_trip():
+    rng = random.Random(1)
+    samples = [random_answers(rng) for _ in range(500)]
+    samples.append({str(q): options_for(q)[0] for q in range(1, QUESTION_COUNT + 1)})
+    samples.append({str(q): options_for(q)[-1] for q in range(1, QUESTION_COUNT + 1)})
+    blobs = [pack_answers(a) for a in samples]
+    assert [unpack_answers(b) for b in blobs] == samples
+    codes = unpack_codes_many(blobs)
+    assert codes.shape == (len(samples), QUESTION_COUNT)
+    expected = [[options_for(q).index(a[str(q)]) for q in range(1, QUESTION_COUNT + 1)] for a in samples]
+    assert codes.tolist() == expected
+
+
+def test_unpack_codes_many_empty():
+    assert unpack_codes_many([]).shape == (0, QUESTION_COUNT)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_single(app_module, seed):
+    engine = app_module.SCORING
+    rng = np.random.default_rng(seed)
+    # codes 0..3 (or 0..4 for Likert) plus the missing code
+    codes = np.stack([rng.integers(0, len(options_for(q)) + 1, size=200) for q in range(1, QUESTION_COUNT + 1)], axis=1)
+    codes[codes == np.array([len(options_for(q)) for q in range(1, QUESTION_COUNT + 1)])] = 5
+    result = engine.score(codes)
+    for i, row in enumerate(codes):
+        answers = {str(q + 1): options_for(q + 1)[c] for q, c in enumerate(row) if c != 5}
+        section_scores, total, max_total, per_q = app_module.compute_scores(answers)
+        assert total == result.total[i]
+        assert list(section_scores.values()) == result.section_totals[i].tolist()
+        assert [per_q[q] for q in range(1, QUESTION_COUNT + 1)] == result.per_question[i].tolist()
+        assert result.percentage[i] == engine.percentage_of(total)
+        assert result.overall_level_names()[i] == app_module.overall_level_and_recommendation(result.percentage[i])[0]
+        for s, sec in enumerate(engine.sections):
+            assert result.section_level_names()[i, s] == app_module.section_level_and_recommendation(sec, section_scores[sec])[0]
+
+
+def test_packed_scoring_matches_dict_scoring(app_module):
+    engine = app_module.SCORING
+    rng = random.Random(2)
+    samples = [random_answers(rng) for _ in range(300)]
+    from_packed = engine.score(engine.encode_packed(pack_answers(a) for a in samples))
+    from_dicts = engine.score(engine.encode_many(samples))
+    assert np.array_equal(from_packed.per_question, from_dicts.per_question)
+    assert np.array_equal(from_packed.total, from_dicts.total)
+
+
+def test_compute_scores_matches_baseline(app_module):
+    rng = random.Random(3)
+    samples = [random_answers(rng) for _ in range(300)]
+    # partly answered forms score the missing questions as 0, as before
+    for a in samples[:50]:
+        for q in rng.sample(range(1, QUESTION_COUNT + 1), 10):
+            del a[str(q)]
+    samples.append({})
+    for answers in samples:
+        assert app_module.compute_scores(answers) == baseline_compute_scores(app_module, answers)
+
+
+def test_level_names_outside_the_table(app_module):
+    # legacy CSV imports can carry scores the answer options cannot reach
+    engine = app_module.SCORING
+    for s, sec in enumerate(engine.sections):
+        for score in (-1, 0, int(engine.section_max[s]), 99):
+            assert engine.section_level_name(s, score) == app_module.section_level_and_recommendation(sec, score)[0]
+    for total in (-5, 0, engine.max_total, 999):
+        assert engine.overall_level_name(total) == \
+            app_module.overall_level_and_recommendation(engine.percentage_of(total))[0]
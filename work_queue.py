@@ -0,0 +1,234 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from sqlite_db import connect
+
+# Shared machinery of the persistent work queues (teacher PDF renders, report emails):
+# rows live in a small SQLite table so a restart does not lose them, and every gunicorn
+# worker can run a few threads that claim rows from it. A claimed row is leased to the
+# thread that took it; a lease that runs out means that worker died, and the row is
+# claimed again. Failures are retried with exponential backoff until max_attempts. Only
+# the newest keep_finished finished rows are kept (older ones are counted in
+# queue_totals), so the table, and stats(), stay the same size however many submissions
+# have gone through.
+
+QUEUED = "queued"
+
+logger = logging.getLogger(__name__)
+
+TOTALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_totals (
+    queue TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pruned INTEGER NOT NULL,
+    PRIMARY KEY (queue, status)
+);
+"""
+
+
+class WorkQueue:
+    # set by subclasses: the table and its schema (with id, status, attempts, run_after,
+    # locked_at, created_at and error columns), the status of a claimed row, of a finished
+    # one and of one that ran out of attempts, and the name of the worker threads
+    table = schema = None
+    active = finished = failed = None
+    thread_name = "queue-worker"
+
+    def __init__(self, db_path, workers=1, batch_size=1, max_pending=1000, max_attempts=3, retry_delay=5.0,
+                 lease=300.0, poll_interval=1.0, keep_finished=1000, prune_interval=60.0):
+        self.db_path = str(db_path)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.keep_finished = keep_finished
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._resumed = None
+        self._threads = []
+        self._pruned_at = 0.0
+        with self._connect() as conn:
+            conn.executescript(self.schema + TOTALS_SCHEMA)
+
+    def _connect(self):
+        return connect(self.db_path, rows=True)
+
+    def start(self):
+        # threads do not survive fork, so (re)start them once per process
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for n in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"{self.thread_name}-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def resume(self):
+        # start() if unfinished rows are left over from a previous run; checked once per process
+        if self._resumed == os.getpid():
+            return
+        self._resumed = os.getpid()
+        conn = self._connect()
+        try:
+            pending = conn.execute(f"SELECT 1 FROM {self.table} WHERE status IN (?, ?) LIMIT 1",
+                                   (QUEUED, self.active)).fetchone()
+        finally:
+            conn.close()
+        if pending is not None:
+            self.start()
+
+    def _insert(self, fields):
+        # fields: {column: value} of a new row; returns its id, or None when the queue is full
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute(f"SELECT COUNT(*) FROM {self.table} WHERE status IN (?, ?)",
+                                   (QUEUED, self.active)).fetchone()[0]
+            if pending >= self.max_pending:
+                conn.execute("ROLLBACK")
+                return None
+            fields = {**fields, "status": QUEUED, "run_after": time.time(), "created_at": datetime.now().isoformat()}
+            cur = conn.execute(f"INSERT INTO {self.table} ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                               tuple(fields.values()))
+            conn.execute("COMMIT")
+            row_id = cur.lastrowid
+        finally:
+            conn.close()
+        self.start()
+        self._wakeup.set()
+        return row_id
+
+    def _claim(self, conn):
+        # up to batch_size due rows, leased to this thread
+        now = time.time()
+        # an active row whose lease expired belonged to a worker that died mid-way
+        due = (f"SELECT * FROM {self.table} WHERE (status = ? AND run_after <= ?) OR (status = ? AND locked_at < ?) "
+               "ORDER BY id LIMIT ?")
+        params = (QUEUED, now, self.active, now - self.lease, self.batch_size)
+        # an idle poll only reads, so it never holds up writers waiting for the write lock
+        if conn.execute(due, params[:-1] + (1,)).fetchone() is None:
+            return []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(due, params).fetchall()
+            conn.executemany(f"UPDATE {self.table} SET status = ?, locked_at = ?, attempts = attempts + 1 WHERE id = ?",
+                             ((self.active, now, row["id"]) for row in rows))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _update(self, conn, row, **fields):
+        conn.execute(f"UPDATE {self.table} SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                     tuple(fields.values()) + (row["id"],))
+
+    def _succeed(self, conn, row, **fields):
+        self._update(conn, row, status=self.finished, error=None, **fields)
+
+    def _fail(self, conn, row, error, permanent=False, **fields):
+        # fields are only written when the row gives up for good
+        if permanent or row["attempts"] + 1 >= self.max_attempts:
+            self._update(conn, row, status=self.failed, error=error, **fields)
+        else:
+            # exponential backoff between attempts
+            delay = self.retry_delay * (2 ** row["attempts"])
+            self._update(conn, row, status=QUEUED, run_after=time.time() + delay, error=error)
+
+    def _requeue(self, conn, row):
+        # claimed but never tried: back in the queue without using up an attempt
+        conn.execute(f"UPDATE {self.table} SET status = ?, attempts = attempts - 1 WHERE id = ?", (QUEUED, row["id"]))
+
+    def work(self):
+        # claim and process due rows; returns how many were claimed
+        raise NotImplementedError
+
+    def _run(self):
+        while True:
+            try:
+                worked = self.work()
+                self.prune_if_due()
+            except sqlite3.OperationalError:
+                # database busy: try again on the next poll
+                worked = 0
+            except Exception:
+                # anything else is a bug or a bad row; a claimed row goes back to the queue once
+                # its lease runs out, and this thread keeps serving the others
+                logger.exception("%s failed", threading.current_thread().name)
+                self._wakeup.clear()
+                worked = 0
+            if not worked:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def prune_if_due(self):
+        # prune at most once every prune_interval seconds in this process
+        if time.monotonic() - self._pruned_at >= self.prune_interval:
+            self._pruned_at = time.monotonic()
+            self.prune()
+
+    def prune(self):
+        # drop finished rows beyond the newest keep_finished, keeping their count; returns how many
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cutoff = conn.execute(f"SELECT id FROM {self.table} WHERE status = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                                  (self.finished, self.keep_finished)).fetchone()
+            n = 0
+            if cutoff is not None:
+                n = conn.execute(f"DELETE FROM {self.table} WHERE status = ? AND id <= ?",
+                                 (self.finished, cutoff[0])).rowcount
+                conn.execute("INSERT INTO queue_totals VALUES (?, ?, ?) "
+                             "ON CONFLICT (queue, status) DO UPDATE SET pruned = pruned + excluded.pruned",
+                             (self.table, self.finished, n))
+            conn.execute("COMMIT")
+            return n
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def stats(self):
+        # rows by status, counting pruned finished rows; reads at most keep_finished + max_pending
+        # rows plus the failed ones
+        conn = self._connect()
+        try:
+            counts = {QUEUED: 0, self.active: 0, self.finished: 0, self.failed: 0}
+            for status, n in conn.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status"):
+                counts[status] = n
+            for status, n in conn.execute("SELECT status, pruned FROM queue_totals WHERE queue = ?", (self.table,)):
+                counts[status] += n
+            return counts
+        finally:
+            conn.close()
+
+    def retry_failed(self, ids=None):
+        # put failed rows (all, or the given ids) back in the queue with fresh attempts
+        conn = self._connect()
+        try:
+            if ids:
+                cur = conn.executemany(f"UPDATE {self.table} SET status = ?, attempts = 0, run_after = ? "
+                                       "WHERE id = ? AND status = ?",
+                                       ((QUEUED, time.time(), i, self.failed) for i in ids))
+            else:
+                cur = conn.execute(f"UPDATE {self.table} SET status = ?, attempts = 0, run_after = ? WHERE status = ?",
+                                   (QUEUED, time.time(), self.failed))
+            n = cur.rowcount
+        finally:
+            conn.close()
+        self._wakeup.set()
+        return n